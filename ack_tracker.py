@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+
+import metrics
+
+
+class AckTracker:
+    """
+    Matches routing ACK/NAK packets to the packets we sent with wantAck.
+
+    Each registered packet waits for an acknowledgement from its destination.
+    A NAK or a timeout hands the chunk back to the scheduler for retransmission
+    with exponential backoff; once max_retries is used up the chunk is marked
+    failed on its message.
+    """
+
+    def __init__(self, retransmit, timeout=60.0, max_retries=2, backoff=5.0):
+        self.retransmit = retransmit
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pending = {}
+        self.lock = threading.Lock()
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._expire_loop, name="ack-tracker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+
+    def register(self, packet_id, message, chunk_index, attempt):
+        with self.lock:
+            self.pending[packet_id] = (message, chunk_index, attempt, time.monotonic() + self.timeout)
+        metrics.set_gauge('transmit.awaiting_ack', len(self.pending))
+
+    def on_routing(self, packet, interface):
+        """pubsub callback for meshtastic.receive.routing."""
+        decoded = packet.get('decoded', {})
+        request_id = decoded.get('requestId')
+        if not request_id:
+            return
+        error_reason = decoded.get('routing', {}).get('errorReason', 'NONE')
+        my_node_num = getattr(getattr(interface, 'myInfo', None), 'my_node_num', None)
+
+        if error_reason == 'NONE' and packet.get('from') == my_node_num:
+            # Implicit ACK: a neighbour rebroadcast the packet, keep waiting for the destination.
+            return
+
+        with self.lock:
+            entry = self.pending.pop(request_id, None)
+        if entry is None:
+            return
+        metrics.set_gauge('transmit.awaiting_ack', len(self.pending))
+        message, chunk_index, attempt, _ = entry
+
+        if error_reason == 'NONE':
+            metrics.increment('transmit.acked')
+            message.mark_chunk(chunk_index, delivered=True)
+        else:
+            metrics.increment('transmit.nak')
+            logging.info(f"Packet {request_id} to {message.label} was NAKed ({error_reason})")
+            self._retry_or_fail(message, chunk_index, attempt)
+
+    def _retry_or_fail(self, message, chunk_index, attempt):
+        if attempt < self.max_retries:
+            delay = self.backoff * (2 ** attempt)
+            metrics.increment('transmit.retransmits')
+            logging.info(f"Retransmitting part {chunk_index + 1} to {message.label} in {delay:.1f}s")
+            self.retransmit(message, chunk_index, attempt + 1, delay)
+        else:
+            metrics.increment('transmit.delivery_failed')
+            logging.warning(f"Giving up on part {chunk_index + 1} to {message.label} after {attempt + 1} attempts")
+            message.mark_chunk(chunk_index, delivered=False)
+
+    def _expire_loop(self):
+        while self._running:
+            time.sleep(1)
+            now = time.monotonic()
+            with self.lock:
+                expired = [(packet_id, entry) for packet_id, entry in self.pending.items() if entry[3] <= now]
+                for packet_id, _ in expired:
+                    del self.pending[packet_id]
+            for packet_id, (message, chunk_index, attempt, _) in expired:
+                metrics.increment('transmit.ack_timeouts')
+                logging.info(f"No ACK for packet {packet_id} to {message.label}")
+                self._retry_or_fail(message, chunk_index, attempt)
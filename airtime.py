@@ -0,0 +1,115 @@
+import logging
+import math
+import time
+
+import metrics
+from ratelimit import TokenBucket
+
+# Meshtastic modem presets indexed by Config.LoRaConfig.ModemPreset:
+# (bandwidth kHz, spreading factor, coding rate denominator)
+MODEM_PRESETS = {
+    0: ('LONG_FAST', 250, 11, 5),
+    1: ('LONG_SLOW', 125, 12, 8),
+    2: ('VERY_LONG_SLOW', 62.5, 12, 8),
+    3: ('MEDIUM_SLOW', 250, 10, 5),
+    4: ('MEDIUM_FAST', 250, 9, 5),
+    5: ('SHORT_SLOW', 250, 8, 5),
+    6: ('SHORT_FAST', 250, 7, 5),
+    7: ('LONG_MODERATE', 125, 11, 8),
+    8: ('SHORT_TURBO', 500, 7, 5),
+}
+DEFAULT_PRESET = 0
+
+# The firmware stores fractional bandwidths as truncated integers.
+CUSTOM_BANDWIDTHS = {31: 31.25, 62: 62.5, 203: 203.125, 406: 406.25, 812: 812.5}
+
+PREAMBLE_SYMBOLS = 16
+# Meshtastic packet header plus protobuf framing of the Data payload.
+PACKET_OVERHEAD_BYTES = 16 + 6
+
+
+def time_on_air(payload_bytes, bandwidth_khz, spreading_factor, coding_rate, preamble=PREAMBLE_SYMBOLS):
+    """
+    Estimate LoRa time-on-air in seconds (Semtech AN1200.13) for an
+    explicit-header packet with CRC enabled.
+    """
+    symbol_time = (2 ** spreading_factor) / (bandwidth_khz * 1000)
+    low_data_rate = 1 if symbol_time > 0.016 else 0
+    cr = coding_rate - 4
+    numerator = 8 * payload_bytes - 4 * spreading_factor + 28 + 16
+    denominator = 4 * (spreading_factor - 2 * low_data_rate)
+    payload_symbols = 8 + max(math.ceil(numerator / denominator) * (cr + 4), 0)
+    return (preamble + 4.25) * symbol_time + payload_symbols * symbol_time
+
+
+class AirtimeAccountant:
+    """
+    Shared duty-cycle budget for everything the BBS puts on the air.
+
+    Time-on-air is estimated from the payload size and the radio's modem
+    settings and charged against a token bucket holding seconds of airtime.
+    When the budget is exhausted, normal traffic is deferred until enough
+    airtime has accrued and droppable traffic is discarded.
+    """
+
+    def __init__(self, interface, duty_cycle=10.0, burst_seconds=30.0):
+        self.interface = interface
+        self.duty_cycle = duty_cycle
+        self.bucket = TokenBucket(duty_cycle / 100.0, burst_seconds)
+        self._modem = None
+
+    @classmethod
+    def from_config(cls, interface, config):
+        return cls(
+            interface,
+            duty_cycle=config.getfloat('airtime', 'duty_cycle', fallback=10.0),
+            burst_seconds=config.getfloat('airtime', 'burst_seconds', fallback=30.0)
+        )
+
+    def modem_settings(self):
+        """Return (bandwidth kHz, spreading factor, coding rate) read once from interface.localNode."""
+        if self._modem is None:
+            self._modem = self._read_modem_settings()
+        return self._modem
+
+    def _read_modem_settings(self):
+        _, bandwidth, spreading_factor, coding_rate = MODEM_PRESETS[DEFAULT_PRESET]
+        try:
+            lora = self.interface.localNode.localConfig.lora
+            if lora.use_preset:
+                name, bandwidth, spreading_factor, coding_rate = MODEM_PRESETS.get(
+                    lora.modem_preset, MODEM_PRESETS[DEFAULT_PRESET])
+                logging.info(f"Airtime budget using modem preset {name}")
+            elif lora.bandwidth and lora.spread_factor and lora.coding_rate:
+                bandwidth = CUSTOM_BANDWIDTHS.get(lora.bandwidth, lora.bandwidth)
+                spreading_factor = lora.spread_factor
+                coding_rate = lora.coding_rate
+                logging.info(f"Airtime budget using custom modem BW{bandwidth} SF{spreading_factor} CR4/{coding_rate}")
+        except AttributeError:
+            logging.info("Modem settings unavailable, assuming LONG_FAST for airtime budget")
+        return bandwidth, spreading_factor, coding_rate
+
+    def estimate(self, payload_bytes):
+        bandwidth, spreading_factor, coding_rate = self.modem_settings()
+        return time_on_air(payload_bytes + PACKET_OVERHEAD_BYTES, bandwidth, spreading_factor, coding_rate)
+
+    def acquire(self, payload_bytes, droppable=False):
+        """
+        Charge one packet against the budget, sleeping until it fits.
+
+        Returns False (and charges nothing) if the packet is droppable and the
+        budget is currently exhausted.
+        """
+        airtime = self.estimate(payload_bytes)
+        delay = self.bucket.delay_for(airtime)
+        if delay > 0:
+            if droppable:
+                metrics.increment('airtime.dropped')
+                return False
+            metrics.increment('airtime.deferred')
+            logging.info(f"Airtime budget exhausted, deferring packet by {delay:.1f}s")
+            time.sleep(delay)
+        self.bucket.force_consume(airtime)
+        metrics.observe('airtime.packet', airtime)
+        metrics.set_gauge('airtime.budget_remaining', round(self.bucket.available(), 2))
+        return True
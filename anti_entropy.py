@@ -0,0 +1,225 @@
+"""
+Anti-entropy reconciliation of bulletins and mail between BBS peers.
+
+Every item is identified by sha1(unique_id) in hex, and a deleted one by
+sha1(unique_id + "/deleted") from its tombstone, so a side that deleted an
+item differs from one that still has it. Each side digests its set of hashes
+as the XOR of their last 24 bits, per bucket of hashes sharing a prefix. The
+exchange drills down only where the digests differ:
+
+    SYNC_ROOT|<table>|<digest>             sent to every peer each interval
+    SYNC_BUCKETS|<table>|<prefix>|<16 digests, one per next hex digit>
+    SYNC_IDS|<table>|<prefix>|<short hash>,...   a bucket small enough to list
+    SYNC_WANT|<table>|<short hash>,...     please push these items to me
+
+When the roots match (the steady state) one short message per peer and
+table is all that is sent. Every message fits in a single packet. Missing
+items are pushed as ordinary BULLETIN/MAIL sync messages and tombstones as
+DELETE_BULLETIN/DELETE_MAIL, which the peer applies even to items it never
+received, so both sides end up with the same tombstone.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+
+from cache import ResultCache
+from db_operations import get_db_connection
+from transmit import get_transmit_scheduler
+from utils import (
+    send_bulletin_to_bbs_nodes,
+    send_delete_bulletin_to_bbs_nodes,
+    send_delete_mail_to_bbs_nodes,
+    send_mail_to_bbs_nodes, send_message
+)
+
+TABLES = ('bulletins', 'mail')
+DIGEST_CHARS = 6
+SHORT_HASH_CHARS = 10
+
+_anti_entropy_lock = threading.Lock()
+
+
+def item_hash(unique_id, live=True):
+    return hashlib.sha1((unique_id if live else unique_id + "/deleted").encode('utf-8')).hexdigest()
+
+
+def _digest(hashes):
+    value = 0
+    for h in hashes:
+        value ^= int(h[-DIGEST_CHARS:], 16)
+    return f"{value:0{DIGEST_CHARS}x}"
+
+
+class AntiEntropy:
+    def __init__(self, interface, interval=900.0, max_ids=14):
+        self.interface = interface
+        self.interval = interval
+        self.max_ids = max_ids
+        # Hashing every unique_id is cheap but not free; one drill-down
+        # exchange reuses the same snapshot of the id sets.
+        self._items = ResultCache('anti_entropy_cache', max_entries=len(TABLES), ttl=10.0)
+
+    @classmethod
+    def from_config(cls, interface, config):
+        return cls(
+            interface,
+            interval=config.getfloat('anti_entropy', 'interval', fallback=900.0),
+            max_ids=config.getint('anti_entropy', 'max_ids', fallback=14)
+        )
+
+    def start(self):
+        thread = threading.Thread(target=self._run, name="anti-entropy", daemon=True)
+        thread.start()
+        return thread
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.send_roots()
+            except Exception as e:
+                logging.error(f"Anti-entropy round failed: {e}")
+
+    def items(self, table):
+        """{hash: (unique_id, live)} for every row of `table` and every tombstone of one."""
+        def load():
+            with get_db_connection() as conn:
+                live = conn.execute(f"SELECT unique_id FROM {table}").fetchall()
+                dead = conn.execute("SELECT unique_id FROM tombstones WHERE kind = ?", (table,)).fetchall()
+            items = {item_hash(unique_id): (unique_id, True) for (unique_id,) in live}
+            items.update((item_hash(unique_id, live=False), (unique_id, False)) for (unique_id,) in dead)
+            return items
+
+        return self._items.get_or_compute(table, load)
+
+    def buckets(self, table, prefix):
+        """The 16 bucket digests one hex digit below `prefix`."""
+        groups = {digit: [] for digit in '0123456789abcdef'}
+        for h in self.items(table):
+            if h.startswith(prefix):
+                groups[h[len(prefix)]].append(h)
+        return "".join(_digest(groups[digit]) for digit in '0123456789abcdef')
+
+    def _send(self, peer, message):
+        send_message(message, peer, self.interface, number_parts=False, lane='sync')
+
+    def send_roots(self):
+        for peer in self.interface.bbs_nodes:
+            for table in TABLES:
+                self._send(peer, f"SYNC_ROOT|{table}|{_digest(self.items(table))}")
+
+    def _ids_per_message(self, header):
+        """How many comma-separated short hashes fit in one packet after header."""
+        max_payload_size = get_transmit_scheduler(self.interface).max_payload_size
+        return max(1, (max_payload_size - len(header.encode('utf-8')) + 1) // (SHORT_HASH_CHARS + 1))
+
+    def _send_ids(self, peer, header, hashes):
+        """Send header followed by the hashes, split over as many single-packet messages as needed."""
+        per_message = self._ids_per_message(header)
+        for i in range(0, max(1, len(hashes)), per_message):
+            self._send(peer, header + ",".join(hashes[i:i + per_message]))
+
+    def _send_bucket(self, peer, table, prefix):
+        """Describe one differing bucket: list it if it is small enough, otherwise split it further."""
+        hashes = [h[:SHORT_HASH_CHARS] for h in self.items(table) if h.startswith(prefix)]
+        if len(hashes) <= self.max_ids or len(prefix) >= SHORT_HASH_CHARS - 1:
+            self._send_ids(peer, f"SYNC_IDS|{table}|{prefix}|", hashes)
+        else:
+            self._send(peer, f"SYNC_BUCKETS|{table}|{prefix}|{self.buckets(table, prefix)}")
+
+    def on_root(self, peer, message):
+        _, table, digest = message.split("|")[:3]
+        if table in TABLES and digest != _digest(self.items(table)):
+            self._send(peer, f"SYNC_BUCKETS|{table}||{self.buckets(table, '')}")
+
+    def on_buckets(self, peer, message):
+        _, table, prefix, digests = message.split("|")[:4]
+        if table not in TABLES:
+            return
+        mine = self.buckets(table, prefix)
+        for i, digit in enumerate('0123456789abcdef'):
+            span = slice(i * DIGEST_CHARS, (i + 1) * DIGEST_CHARS)
+            if mine[span] != digests[span]:
+                self._send_bucket(peer, table, prefix + digit)
+
+    def on_ids(self, peer, message):
+        _, table, prefix, listed = message.split("|")[:4]
+        if table not in TABLES:
+            return
+        theirs = {h for h in listed.split(",") if h}
+        mine = {h[:SHORT_HASH_CHARS]: item for h, item in self.items(table).items() if h.startswith(prefix)}
+        self.push(peer, table, [item for h, item in mine.items() if h not in theirs])
+        wanted = sorted(theirs - set(mine))
+        if wanted:
+            self._send_ids(peer, f"SYNC_WANT|{table}|", wanted)
+
+    def on_want(self, peer, message):
+        _, table, listed = message.split("|")[:3]
+        if table not in TABLES:
+            return
+        wanted = set(listed.split(","))
+        self.push(peer, table, [item for h, item in self.items(table).items() if h[:SHORT_HASH_CHARS] in wanted])
+
+    def push(self, peer, table, items):
+        """Send the given (unique_id, live) items to one peer as regular sync messages."""
+        deleted = [unique_id for unique_id, live in items if not live]
+        if deleted:
+            logging.info(f"Anti-entropy: sending {len(deleted)} {table} deletions to {peer}")
+            send_delete = send_delete_bulletin_to_bbs_nodes if table == 'bulletins' else send_delete_mail_to_bbs_nodes
+            for unique_id in deleted:
+                send_delete(unique_id, [peer], self.interface)
+        unique_ids = [unique_id for unique_id, live in items if live]
+        if not unique_ids:
+            return
+        logging.info(f"Anti-entropy: sending {len(unique_ids)} missing {table} items to {peer}")
+        # Read everything first; queuing the sync messages needs a connection of its own.
+        rows = []
+        with get_db_connection() as conn:
+            for i in range(0, len(unique_ids), 500):
+                batch = unique_ids[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                if table == 'bulletins':
+                    rows += conn.execute("SELECT board, sender_short_name, subject, content, unique_id, created_at "
+                                         f"FROM bulletins WHERE unique_id IN ({placeholders})", batch).fetchall()
+                else:
+                    rows += conn.execute("SELECT sender, sender_short_name, recipient, subject, content, unique_id, "
+                                         f"created_at FROM mail WHERE unique_id IN ({placeholders})", batch).fetchall()
+        for row in rows:
+            if table == 'bulletins':
+                board, sender_short_name, subject, content, unique_id, created_at = row
+                send_bulletin_to_bbs_nodes(board, sender_short_name, subject, content, unique_id, [peer],
+                                           self.interface, created_at=created_at)
+            else:
+                sender, sender_short_name, recipient, subject, content, unique_id, created_at = row
+                send_mail_to_bbs_nodes(sender, sender_short_name, recipient, subject, content, unique_id, [peer],
+                                       self.interface, created_at=created_at)
+
+
+def get_anti_entropy(interface):
+    """Return the reconciler attached to the interface, creating a default one if needed."""
+    anti_entropy = getattr(interface, 'anti_entropy', None)
+    if anti_entropy is None:
+        with _anti_entropy_lock:
+            anti_entropy = getattr(interface, 'anti_entropy', None)
+            if anti_entropy is None:
+                anti_entropy = AntiEntropy(interface)
+                interface.anti_entropy = anti_entropy
+    return anti_entropy
+
+
+def handle_sync_root(sender_id, message, interface):
+    get_anti_entropy(interface).on_root(sender_id, message)
+
+
+def handle_sync_buckets(sender_id, message, interface):
+    get_anti_entropy(interface).on_buckets(sender_id, message)
+
+
+def handle_sync_ids(sender_id, message, interface):
+    get_anti_entropy(interface).on_ids(sender_id, message)
+
+
+def handle_sync_want(sender_id, message, interface):
+    get_anti_entropy(interface).on_want(sender_id, message)
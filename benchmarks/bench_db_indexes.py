@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+"""
+Time the hot bulletins.db queries on a large synthetic database before and
+after it is migrated in place to the current schema (indexes and unique_id
+constraints).
+
+Usage (from the repository root):
+    python benchmarks/bench_db_indexes.py [--rows 200000] [--queries 200]
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import migrate, schema_version  # noqa: E402
+
+BOARDS = ["General", "Info", "News", "Urgent"]
+
+
+def create_legacy_schema(conn):
+    """The schema as initialize_database created it before any indexes existed."""
+    conn.execute('''CREATE TABLE bulletins (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    board TEXT NOT NULL,
+                    sender_short_name TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    unique_id TEXT NOT NULL
+                )''')
+    conn.execute('''CREATE TABLE mail (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sender TEXT NOT NULL,
+                    sender_short_name TEXT NOT NULL,
+                    recipient TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    unique_id TEXT NOT NULL
+                )''')
+
+
+def populate(conn, rows, recipients):
+    bulletin_ids = [str(uuid.uuid4()) for _ in range(rows)]
+    mail_ids = [str(uuid.uuid4()) for _ in range(rows)]
+    conn.executemany(
+        "INSERT INTO bulletins (board, sender_short_name, date, subject, content, unique_id) VALUES (?, ?, ?, ?, ?, ?)",
+        ((random.choice(BOARDS), "ABCD", "2024-07-14 12:00", f"Subject {i}", "x" * 120, bulletin_ids[i])
+         for i in range(rows)))
+    conn.executemany(
+        "INSERT INTO mail (sender, sender_short_name, recipient, date, subject, content, unique_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (("!00000001", "ABCD", random.choice(recipients), "2024-07-14 12:00", f"Subject {i}", "x" * 120, mail_ids[i])
+         for i in range(rows)))
+    # Repeated sync used to insert duplicates; add a few so the upgrade has something to clean up.
+    conn.executemany(
+        "INSERT INTO mail (sender, sender_short_name, recipient, date, subject, content, unique_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (("!00000001", "ABCD", recipients[0], "2024-07-14 12:00", "Dup", "x", unique_id)
+         for unique_id in mail_ids[:100]))
+    conn.commit()
+    return bulletin_ids, mail_ids
+
+
+def time_queries(conn, queries, recipients, mail_ids):
+    results = {}
+    lookups = {
+        "bulletins by board (NOCASE)": (
+            "SELECT id, subject, sender_short_name, date, unique_id FROM bulletins WHERE board = ? COLLATE NOCASE",
+            lambda: (random.choice(BOARDS).lower(),)),
+        "mail by recipient": (
+            "SELECT id, sender_short_name, subject, date, unique_id FROM mail WHERE recipient = ?",
+            lambda: (random.choice(recipients),)),
+        "mail by unique_id": (
+            "SELECT recipient FROM mail WHERE unique_id = ?",
+            lambda: (random.choice(mail_ids),)),
+    }
+    for label, (sql, params) in lookups.items():
+        start = time.perf_counter()
+        for _ in range(queries):
+            conn.execute(sql, params()).fetchall()
+        results[label] = (time.perf_counter() - start) / queries
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bulletins.db indexes")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    recipients = [f"!{num:08x}" for num in range(1, 2001)]
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bulletins.db"))
+        create_legacy_schema(conn)
+        _, mail_ids = populate(conn, args.rows, recipients)
+        print(f"{args.rows} bulletins, {args.rows + 100} mail rows, {args.queries} queries each")
+
+        before = time_queries(conn, args.queries, recipients, mail_ids)
+        start = time.perf_counter()
+        migrate(conn, 'bulletins')
+        print(f"in-place upgrade to schema version {schema_version(conn)} took {time.perf_counter() - start:.2f}s")
+        after = time_queries(conn, args.queries, recipients, mail_ids)
+        conn.close()
+
+    print(f"{'query':<30} {'before':>12} {'after':>12} {'speedup':>9}")
+    for label in before:
+        print(f"{label:<30} {before[label] * 1e3:10.3f}ms {after[label] * 1e3:10.3f}ms "
+              f"{before[label] / after[label]:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
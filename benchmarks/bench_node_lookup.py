@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+"""
+Compare the NodeDB lookups in utils against the linear scans they replaced.
+
+Usage (from the repository root):
+    python benchmarks/bench_node_lookup.py [--nodes 5000] [--calls 2000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import get_node_id_from_num, get_node_info  # noqa: E402
+
+
+class FakeInterface:
+    def __init__(self, node_count):
+        self.nodes = {}
+        for num in range(1, node_count + 1):
+            node_id = f"!{num:08x}"
+            self.nodes[node_id] = {
+                'num': num,
+                'user': {'id': node_id, 'shortName': f"N{num % 9973:04d}", 'longName': f"Node {num}"}
+            }
+
+
+def scan_node_id_from_num(node_num, interface):
+    for node_id, node in interface.nodes.items():
+        if node['num'] == node_num:
+            return node_id
+    return None
+
+
+def scan_node_info(interface, short_name):
+    return [{'num': node_id, 'shortName': node['user']['shortName'], 'longName': node['user']['longName']}
+            for node_id, node in interface.nodes.items()
+            if node['user']['shortName'].lower() == short_name]
+
+
+def run(label, func, calls):
+    seconds = timeit.timeit(func, number=calls)
+    print(f"{label:<32} {seconds / calls * 1e6:10.2f} us/call")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark NodeDB lookups")
+    parser.add_argument("--nodes", type=int, default=5000)
+    parser.add_argument("--calls", type=int, default=2000)
+    args = parser.parse_args()
+
+    interface = FakeInterface(args.nodes)
+    nums = [random.randint(1, args.nodes) for _ in range(args.calls)]
+    short_names = [f"n{num % 9973:04d}" for num in nums]
+    get_node_id_from_num(1, interface)  # build the index outside the timed region
+
+    print(f"{args.nodes} nodes, {args.calls} calls")
+    nums_iter = iter(nums * 2)
+    scan = run("scan get_node_id_from_num", lambda: scan_node_id_from_num(next(nums_iter), interface), args.calls)
+    indexed = run("indexed get_node_id_from_num", lambda: get_node_id_from_num(next(nums_iter), interface), args.calls)
+    print(f"{'speedup':<32} {scan / indexed:10.1f}x")
+
+    names_iter = iter(short_names * 2)
+    scan = run("scan get_node_info", lambda: scan_node_info(interface, next(names_iter)), args.calls)
+    indexed = run("indexed get_node_info", lambda: get_node_info(interface, next(names_iter)), args.calls)
+    print(f"{'speedup':<32} {scan / indexed:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
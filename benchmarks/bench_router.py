@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+
+"""
+Measure the per-message cost of resolving a user message to its handler with
+the CommandRouter, compared with the if/elif chain it replaced.
+
+Usage (from the repository root, with a config.ini present):
+    python benchmarks/bench_router.py [--calls 200000]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_processing import (  # noqa: E402
+    router, main_menu_handlers, bbs_menu_handlers, utilities_menu_handlers, bulletin_menu_handlers,
+    board_action_handlers
+)
+
+SAMPLES = [
+    ("wx,Detroit", None),
+    ("CM", None),
+    ("SM,,@abcd,,Hello,,Body", None),
+    ("q", None),
+    ("b", {'command': 'MENU', 'menu': 'bbs', 'step': 1}),
+    ("r", {'command': 'BULLETIN_ACTION', 'step': 1, 'board': 'General'}),
+    ("Lunch on Friday?", {'command': 'MAIL', 'step': 3}),
+    ("2", {'command': 'CHECK_MAIL', 'step': 2}),
+    ("y", {'command': 'ANNOUNCEMENT', 'step': 2}),
+    ("nothing", None),
+]
+
+
+def legacy_resolve(message, state):
+    """The lookup order of the original process_message, returning the handler it would call."""
+    message_lower = message.lower().strip()
+    if len(message_lower) == 2 and message_lower[1] == 'x' and message_lower != 'wx':
+        message_lower = message_lower[0]
+
+    for prefix in ("sm,,", "cm", "pb,,", "cb,,", "chp,,", "chl", "tt", "wx"):
+        if message_lower.startswith(prefix):
+            return prefix
+
+    if state and state['command'] == 'MENU':
+        menu_name = state['menu']
+        if menu_name == 'bbs':
+            handlers = bbs_menu_handlers
+        elif menu_name == 'utilities':
+            handlers = utilities_menu_handlers
+        else:
+            handlers = main_menu_handlers
+    elif state and state['command'] == 'BULLETIN_MENU':
+        handlers = bulletin_menu_handlers
+    elif state and state['command'] == 'BULLETIN_ACTION':
+        handlers = board_action_handlers
+    elif state and state['command'] == 'JS8CALL_MENU':
+        return 'js8call'
+    elif state and state['command'] == 'GROUP_MESSAGES':
+        return 'group'
+    else:
+        handlers = main_menu_handlers
+
+    if message_lower == 'x':
+        return 'help'
+    if message_lower in handlers:
+        return handlers[message_lower]
+    if state:
+        for command in ('MAIL', 'BULLETIN', 'STATS', 'CHANNEL_DIRECTORY', 'CHECK_MAIL', 'CHECK_BULLETIN',
+                        'CHECK_CHANNEL', 'LIST_CHANNELS', 'BULLETIN_POST', 'BULLETIN_POST_CONTENT',
+                        'BULLETIN_READ', 'JS8CALL_MENU', 'GROUP_MESSAGES', 'ANNOUNCEMENT'):
+            if state['command'] == command:
+                return command
+    return 'help'
+
+
+def run(label, func, calls):
+    seconds = timeit.timeit(func, number=calls)
+    print(f"{label:<24} {seconds / calls * 1e6:10.3f} us/message")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inbound command dispatch")
+    parser.add_argument("--calls", type=int, default=200000)
+    args = parser.parse_args()
+
+    samples = SAMPLES * (args.calls // len(SAMPLES) + 1)
+    print(f"{args.calls} messages")
+    legacy_iter = iter(samples)
+
+    def legacy_next():
+        message, state = next(legacy_iter)
+        return legacy_resolve(message, state)
+
+    router_iter = iter(samples)
+
+    def resolve_next():
+        message, state = next(router_iter)
+        return router.resolve(1, message, None, state)
+
+    legacy = run("if/elif chain", legacy_next, args.calls)
+    routed = run("CommandRouter.resolve", resolve_next, args.calls)
+    print(f"{'ratio':<24} {legacy / routed:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
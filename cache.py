@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResultCache:
+    """
+    In-process LRU cache for query results and rendered replies.
+
+    get_or_compute() runs compute() only on a miss; None results are not
+    cached, so a lookup of a row that does not exist yet is never pinned.
+    Concurrent misses for the same key share one computation (single-flight):
+    the first caller computes and the others wait for its result. Each entry
+    carries tags, and invalidate(tag) drops every entry with that tag; a
+    computation that was running when its tag was invalidated returns its
+    result without caching it. Entries also expire after ttl seconds, which
+    bounds staleness after writes made by other processes such as
+    db_admin.py.
+    """
+
+    def __init__(self, name, max_entries=256, ttl=300.0):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._generations = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def configure(self, config):
+        """Apply the [cache] section of config.ini; max_entries = 0 disables caching."""
+        self.max_entries = config.getint('cache', 'max_entries', fallback=self.max_entries)
+        self.ttl = config.getfloat('cache', 'ttl', fallback=self.ttl)
+        self.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_compute(self, key, compute, tags=()):
+        if self.max_entries <= 0:
+            return compute()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            hit = entry is not None and entry[1] > now
+            if hit:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            metrics.set_gauge(f'{self.name}.hit_rate', round(self.hits / (self.hits + self.misses), 3))
+            if hit:
+                metrics.increment(f'{self.name}.hits')
+                return entry[0]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                generations = [self._epoch] + [self._generations.get(tag, 0) for tag in tags]
+
+        if not leader:
+            metrics.increment(f'{self.name}.shared')
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        metrics.increment(f'{self.name}.misses')
+        try:
+            flight.value = compute()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                current = [self._epoch] + [self._generations.get(tag, 0) for tag in tags]
+                if flight.error is None and flight.value is not None and current == generations:
+                    self._entries[key] = (flight.value, time.monotonic() + self.ttl, tuple(tags))
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                metrics.set_gauge(f'{self.name}.entries', len(self._entries))
+            flight.done.set()
+        return flight.value
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            stale = [key for key, entry in self._entries.items() if any(tag in entry[2] for tag in tags)]
+            for key in stale:
+                del self._entries[key]
+            metrics.set_gauge(f'{self.name}.entries', len(self._entries))
+        if stale:
+            metrics.increment(f'{self.name}.invalidated', len(stale))
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            metrics.set_gauge(f'{self.name}.entries', 0)
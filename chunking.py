@@ -0,0 +1,120 @@
+def byte_length(text):
+    return len(text.encode('utf-8'))
+
+
+def _split_by_bytes(text, max_bytes):
+    """Split text into pieces of at most max_bytes without cutting a UTF-8 character."""
+    pieces = []
+    current = ''
+    current_bytes = 0
+    for char in text:
+        char_bytes = byte_length(char)
+        if current and current_bytes + char_bytes > max_bytes:
+            pieces.append(current)
+            current = ''
+            current_bytes = 0
+        current += char
+        current_bytes += char_bytes
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _split_line(line, max_bytes):
+    """Break a line that is too long for one packet at word boundaries."""
+    pieces = []
+    current = ''
+    for word in line.split(' '):
+        candidate = f"{current} {word}" if current else word
+        if byte_length(candidate) <= max_bytes:
+            current = candidate
+            continue
+        if current:
+            pieces.append(current)
+        if byte_length(word) <= max_bytes:
+            current = word
+        else:
+            # A single word longer than a packet (e.g. a URL) is split mid-word.
+            parts = _split_by_bytes(word, max_bytes)
+            pieces.extend(parts[:-1])
+            current = parts[-1]
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _take_words(line, max_bytes, packet_bytes):
+    """
+    Split line into (head, rest), where head is as many leading words as fit
+    in max_bytes. A first word that is too long for a whole packet is going
+    to be split mid-word anyway, so it is cut to fill max_bytes.
+    """
+    words = line.split(' ')
+    head = ''
+    for i, word in enumerate(words):
+        candidate = f"{head} {word}" if i else word
+        if byte_length(candidate) > max_bytes:
+            if i == 0 and max_bytes > 0 and byte_length(word) > packet_bytes:
+                head = _split_by_bytes(word, max_bytes)[0]
+                return head, line[len(head):]
+            return head, ' '.join(words[i:])
+        head = candidate
+    return head, ''
+
+
+def _pack(text, max_bytes):
+    chunks = []
+    current = None
+    for line in text.split('\n'):
+        candidate = line if current is None else f"{current}\n{line}"
+        if byte_length(candidate) <= max_bytes:
+            current = candidate
+            continue
+        if byte_length(line) <= max_bytes:
+            if current is not None:
+                chunks.append(current)
+            current = line
+        else:
+            if current is not None:
+                # The line needs several packets anyway, so start it in the
+                # space left over here instead of sending a near-empty packet.
+                head, rest = _take_words(line, max_bytes - byte_length(current) - 1, max_bytes)
+                if head:
+                    current, line = f"{current}\n{head}", rest
+                if current:
+                    chunks.append(current)
+            pieces = _split_line(line, max_bytes)
+            chunks.extend(pieces[:-1])
+            current = pieces[-1] if pieces else ''
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_message(text, max_bytes=200, number_parts=True):
+    """
+    Split text into as few packets of at most max_bytes (UTF-8 encoded) as possible.
+
+    Whole lines are packed greedily; a line that does not fit on its own is
+    broken at word boundaries. When more than one packet is needed and
+    number_parts is set, each packet is prefixed with its position ("1/3 ").
+    Empty or whitespace-only text needs no packets at all.
+    """
+    if not text.strip():
+        return []
+    if byte_length(text) <= max_bytes:
+        return [text]
+    if not number_parts:
+        return _pack(text, max_bytes)
+
+    # The prefix width depends on the number of parts, so repeat the packing
+    # until the reserved width matches the result.
+    total = 9
+    while True:
+        prefix_bytes = byte_length(f"{total}/{total} ")
+        chunks = _pack(text, max_bytes - prefix_bytes)
+        if len(str(len(chunks))) <= len(str(total)):
+            break
+        total = 10 ** len(str(total)) * 10 - 1
+    count = len(chunks)
+    return [f"{i}/{count} {chunk}" for i, chunk in enumerate(chunks, start=1)]
@@ -8,12 +8,16 @@ import time
 
 from meshtastic import BROADCAST_NUM
 
+import db_pool
+from chunking import byte_length, chunk_message
 from db_operations import (
-    add_bulletin, add_mail, delete_mail,
-    get_bulletin_content, get_bulletins,
-    get_mail, get_mail_content,
+    bulletin_cache, add_bulletin, add_mail, delete_mail,
+    get_bulletin_content, get_board_counts, get_bulletins_page, mark_bulletin_read, page_cursor, search_bulletins,
+    get_mail_content, get_mail_counts, get_mail_page, mark_mail_read, search_mail,
     add_channel, get_channels, get_sender_id_by_mail_id
 )
+from node_index import get_node_index
+from transmit import get_transmit_scheduler
 from utils import (
     get_node_id_from_num, get_node_info,
     get_node_short_name, send_message,
@@ -72,17 +76,120 @@ def handle_help_command(sender_id, interface, menu_name=None):
             response = build_menu(utilities_menu_items, "🛠️Utilities Menu🛠️")
     else:
         update_user_state(sender_id, {'command': 'MAIN_MENU', 'step': 1})  # Reset to main menu state
-        mail = get_mail(get_node_id_from_num(sender_id, interface))
-        response = build_menu(main_menu_items, f"💾TC² BBS💾 (✉️:{len(mail)})")
+        total, unread = get_mail_counts(get_node_id_from_num(sender_id, interface))
+        mail_summary = f"✉️:{total}, {unread} new" if unread else f"✉️:{total}"
+        response = build_menu(main_menu_items, f"💾TC² BBS💾 ({mail_summary})")
     send_message(response, sender_id, interface)
 
 def get_node_name(node_id, interface):
-    node_info = interface.nodes.get(node_id)
+    node_info = get_node_index(interface).get(node_id)
     if node_info:
         return node_info['user']['longName']
     return f"Node {node_id}"
 
 
+def fit_lines(interface, header, lines, footer, from_end=False):
+    """
+    Return the (first, last) indexes of the longest run of lines that fits in
+    one packet together with header and footer, starting from the first line
+    (or the last one with from_end). At least one line is always kept.
+    """
+    budget = get_transmit_scheduler(interface).max_payload_size - byte_length(header) - byte_length(footer)
+    order = range(len(lines) - 1, -1, -1) if from_end else range(len(lines))
+    shown = []
+    for i in order:
+        budget -= byte_length(lines[i]) + 1
+        if shown and budget < 0:
+            break
+        shown.append(i)
+    return min(shown), max(shown)
+
+
+def send_listing_page(sender_id, interface, state, direction, fetch, header, format_row):
+    """
+    Send one page of a newest-first listing and remember only its cursor.
+
+    With no direction the newest page is sent; 'n' moves to older rows than
+    the page recorded in state and 'p' to newer ones. fetch(before=...,
+    after=...) returns (rows, more) as the db_operations *_page functions
+    do. Rows that would not fit in one packet are left for the next page.
+    Returns False when there was nothing to show.
+    """
+    if direction == 'n':
+        rows, more = fetch(before=state['last'])
+        has_older, has_newer = more, True
+    elif direction == 'p':
+        rows, more = fetch(after=state['first'])
+        has_older, has_newer = True, more
+    else:
+        rows, more = fetch()
+        has_older, has_newer = more, False
+    if not rows:
+        if direction:
+            send_message("No older messages." if direction == 'n' else "No newer messages.", sender_id, interface)
+        return False
+
+    lines = [format_row(row) for row in rows]
+    # Going back to newer rows, keep the ones closest to the page we came from.
+    first, last = fit_lines(interface, header, lines, "\nReply with a number to read.\n[N]ext  [P]rev  E[X]IT",
+                            from_end=direction == 'p')
+    if last - first + 1 < len(lines):
+        if direction == 'p':
+            has_newer = True
+        else:
+            has_older = True
+
+    nav = (["[N]ext"] if has_older else []) + (["[P]rev"] if has_newer else []) + ["E[X]IT"]
+    response = "\n".join([header] + lines[first:last + 1] + ["Reply with a number to read.", "  ".join(nav)])
+    send_message(response, sender_id, interface)
+    update_user_state(sender_id, dict(state, first=page_cursor(rows[first]), last=page_cursor(rows[last])))
+    return True
+
+
+def bulletin_reply(bulletin_id, interface):
+    """
+    Return (text, chunks) for reading a bulletin, or None if it does not
+    exist. The rendered, packet-split reply is cached per bulletin, so a
+    crowd reading the same urgent bulletin costs one query and one render.
+    """
+    max_payload_size = get_transmit_scheduler(interface).max_payload_size
+
+    def render():
+        bulletin = get_bulletin_content(bulletin_id)
+        if bulletin is None:
+            return None
+        sender, date, subject, content, unique_id = bulletin
+        text = f"Date: {date}\nFrom: {sender}\nSubject: {subject}\n\n{content}"
+        return text, tuple(chunk_message(text, max_payload_size))
+
+    return bulletin_cache.get_or_compute(('reply', bulletin_id, max_payload_size), render,
+                                         tags=(f"bulletin:{bulletin_id}",))
+
+
+def send_bulletin_page(sender_id, interface, board_name, state, direction=None):
+    return send_listing_page(sender_id, interface, state, direction,
+                             lambda **cursor: get_bulletins_page(board_name, **cursor),
+                             f"📰 {board_name} board:", lambda row: f"[{row[0]}] {row[1]} ({row[2]})")
+
+
+def send_mail_page(sender_id, interface, state, direction=None):
+    node_id = get_node_id_from_num(sender_id, interface)
+    return send_listing_page(sender_id, interface, state, direction,
+                             lambda **cursor: get_mail_page(node_id, **cursor),
+                             "📬 Your mail:", lambda row: f"[{row[0]}] {row[1]}: {row[2]}")
+
+
+def notify_mail_recipient(sender_id, sender_short_name, recipient_id, recipient_name, interface):
+    """Tell the recipient about new mail and let the sender know if the notice could not be delivered."""
+    def on_delivery(message):
+        if message.status == 'failed':
+            logging.info(f"New mail notification to {recipient_id} was not acknowledged")
+            send_message(f"⚠️ {recipient_name} could not be notified over the mesh. The mail will be waiting when they check with CM.", sender_id, interface)
+
+    notification_message = f"You have a new mail message from {sender_short_name}. Check your mailbox by responding to this message with CM."
+    send_message(notification_message, recipient_id, interface, on_delivery=on_delivery)
+
+
 def handle_mail_command(sender_id, interface):
     response = "✉️Mail Menu✉️\nWhat would you like to do with mail?\n[R]ead  [S]end E[X]IT"
     send_message(response, sender_id, interface)
@@ -262,21 +369,16 @@ def handle_bb_steps(sender_id, message, step, state, interface, bbs_nodes):
             handle_help_command(sender_id, interface, 'bbs')
             return
         board_name = boards[int(message)]
-        bulletins = get_bulletins(board_name)
-        response = f"{board_name} has {len(bulletins)} messages.\n[R]ead  [P]ost"
+        total, unread = get_board_counts(board_name, get_node_id_from_num(sender_id, interface))
+        response = f"{board_name} has {total} messages ({unread} new).\n[R]ead  [P]ost"
         send_message(response, sender_id, interface)
         update_user_state(sender_id, {'command': 'BULLETIN_ACTION', 'step': 2, 'board': board_name})
 
     elif step == 2:
         board_name = state['board']
         if message.lower() == 'r':
-            bulletins = get_bulletins(board_name)
-            if bulletins:
-                send_message(f"Select a bulletin number to view from {board_name}:", sender_id, interface)
-                for bulletin in bulletins:
-                    send_message(f"[{bulletin[0]}] {bulletin[1]}", sender_id, interface)
-                update_user_state(sender_id, {'command': 'BULLETIN_READ', 'step': 3, 'board': board_name})
-            else:
+            if not send_bulletin_page(sender_id, interface, board_name,
+                                      {'command': 'BULLETIN_READ', 'step': 3, 'board': board_name}):
                 send_message(f"No bulletins in {board_name}.", sender_id, interface)
                 handle_bb_steps(sender_id, 'e', 1, state, interface, bbs_nodes)
         elif message.lower() == 'p':
@@ -292,10 +394,17 @@ def handle_bb_steps(sender_id, message, step, state, interface, bbs_nodes):
             update_user_state(sender_id, {'command': 'BULLETIN_POST', 'step': 4, 'board': board_name})
 
     elif step == 3:
+        if message.lower().strip() in ('n', 'p'):
+            send_bulletin_page(sender_id, interface, state['board'], state, message.lower().strip())
+            return
         bulletin_id = int(message)
-        sender_short_name, date, subject, content, unique_id = get_bulletin_content(bulletin_id)
-        send_message(f"From: {sender_short_name}\nDate: {date}\nSubject: {subject}\n- - - - - - -\n{content}", sender_id, interface)
-        board_name = state['board']
+        reply = bulletin_reply(bulletin_id, interface)
+        if reply is None:
+            send_message("Invalid bulletin number. Please try again.", sender_id, interface)
+            return
+        text, chunks = reply
+        send_message(text, sender_id, interface, chunks=chunks)
+        mark_bulletin_read(get_node_id_from_num(sender_id, interface), state['board'], bulletin_id)
         handle_bb_steps(sender_id, 'e', 1, state, interface, bbs_nodes)
 
     elif step == 4:
@@ -309,7 +418,7 @@ def handle_bb_steps(sender_id, message, step, state, interface, bbs_nodes):
             subject = state['subject']
             content = state['content']
             node_id = get_node_id_from_num(sender_id, interface)
-            node_info = interface.nodes.get(node_id)
+            node_info = get_node_index(interface).get(node_id)
             if node_info is None:
                 send_message("Error: Unable to retrieve your node information.", sender_id, interface)
                 update_user_state(sender_id, None)
@@ -332,14 +441,7 @@ def handle_mail_steps(sender_id, message, step, state, interface, bbs_nodes):
     if step == 1:
         choice = message.lower()
         if choice == 'r':
-            sender_node_id = get_node_id_from_num(sender_id, interface)
-            mail = get_mail(sender_node_id)
-            if mail:
-                send_message(f"You have {len(mail)} mail messages. Select a message number to read:", sender_id, interface)
-                for msg in mail:
-                    send_message(f"-{msg[0]}-\nDate: {msg[3]}\nFrom: {msg[1]}\nSubject: {msg[2]}", sender_id, interface)
-                update_user_state(sender_id, {'command': 'MAIL', 'step': 2})
-            else:
+            if not send_mail_page(sender_id, interface, {'command': 'MAIL', 'step': 2}):
                 send_message("There are no messages in your mailbox.📭", sender_id, interface)
                 update_user_state(sender_id, None)
         elif choice == 's':
@@ -349,13 +451,18 @@ def handle_mail_steps(sender_id, message, step, state, interface, bbs_nodes):
             handle_help_command(sender_id, interface)
 
     elif step == 2:
+        choice = message.strip().lower()
+        if choice in ('n', 'p'):
+            send_mail_page(sender_id, interface, state, choice)
+            return
         mail_id = int(message)
         try:
             sender_node_id = get_node_id_from_num(sender_id, interface)
             sender, date, subject, content, unique_id = get_mail_content(mail_id, sender_node_id)
             send_message(f"Date: {date}\nFrom: {sender}\nSubject: {subject}\n{content}", sender_id, interface)
+            mark_mail_read(mail_id)
             send_message("What would you like to do with this message?\n[K]eep  [D]elete  [R]eply", sender_id, interface)
-            update_user_state(sender_id, {'command': 'MAIL', 'step': 4, 'mail_id': mail_id, 'unique_id': unique_id, 'sender': sender, 'subject': subject, 'content': content})
+            update_user_state(sender_id, {'command': 'MAIL', 'step': 4, 'mail_id': mail_id, 'unique_id': unique_id, 'sender': sender, 'subject': subject})
         except TypeError:
             logging.info(f"Node {sender_id} tried to access non-existent message")
             send_message("Mail not found", sender_id, interface)
@@ -376,7 +483,7 @@ def handle_mail_steps(sender_id, message, step, state, interface, bbs_nodes):
             send_message("There are multiple nodes with that short name. Which one would you like to leave a message for?", sender_id, interface)
             for i, node in enumerate(nodes):
                 send_message(f"[{i}] {node['longName']}", sender_id, interface)
-            update_user_state(sender_id, {'command': 'MAIL', 'step': 6, 'nodes': nodes})
+            update_user_state(sender_id, {'command': 'MAIL', 'step': 6, 'node_nums': [node['num'] for node in nodes]})
 
     elif step == 4:
         if message.lower() == "d":
@@ -400,8 +507,7 @@ def handle_mail_steps(sender_id, message, step, state, interface, bbs_nodes):
 
     elif step == 6:
         selected_node_index = int(message)
-        selected_node = state['nodes'][selected_node_index]
-        recipient_id = selected_node['num']
+        recipient_id = state['node_nums'][selected_node_index]
         recipient_name = get_node_name(recipient_id, interface)
         send_message(f"What is the subject of your message to {recipient_name}?\nKeep it short.", sender_id, interface)
         update_user_state(sender_id, {'command': 'MAIL', 'step': 5, 'recipient_id': recipient_id})
@@ -420,8 +526,7 @@ def handle_mail_steps(sender_id, message, step, state, interface, bbs_nodes):
             unique_id = add_mail(get_node_id_from_num(sender_id, interface), sender_short_name, recipient_id, subject, content, bbs_nodes, interface)
             send_message(f"Mail has been posted to the mailbox of {recipient_name}.\n(╯°□°)╯📨📬", sender_id, interface)
 
-            notification_message = f"You have a new mail message from {sender_short_name}. Check your mailbox by responding to this message with CM."
-            send_message(notification_message, recipient_id, interface)
+            notify_mail_recipient(sender_id, sender_short_name, recipient_id, recipient_name, interface)
 
             update_user_state(sender_id, None)
             update_user_state(sender_id, {'command': 'MAIL', 'step': 8})
@@ -457,8 +562,7 @@ def handle_mqtt_topics_command(sender_id, interface):
         return
 
     try:
-        conn = sqlite3.connect(db_path)
-        try:
+        with db_pool.connection(db_path) as conn:
             cursor = conn.execute(
                 """
                 SELECT base_topic, subtopic, message_count
@@ -468,8 +572,6 @@ def handle_mqtt_topics_command(sender_id, interface):
                 """
             )
             rows = cursor.fetchall()
-        finally:
-            conn.close()
     except sqlite3.Error as exc:
         logging.error(f"Error reading MQTT topic stats: {exc}")
         send_message("Unable to read MQTT topic statistics.", sender_id, interface)
@@ -480,8 +582,7 @@ def handle_mqtt_topics_command(sender_id, interface):
         return
 
     # Send header first
-    send_message("🏆 Top 15 Topics 🏆", sender_id, interface)
-    time.sleep(3)  # Delay before sending first chunk
+    send_message("🏆 Top 15 Topics 🏆", sender_id, interface, droppable=True)
     
     # Build all topic lines
     topic_lines = []
@@ -494,18 +595,14 @@ def handle_mqtt_topics_command(sender_id, interface):
             topic = "(base)"
         topic_lines.append(f"{idx:02d}. {topic} — {message_count:,}")
     
-    # Send in chunks of 3 lines per message
+    # Send in chunks of 3 lines per message; the transmit scheduler paces them
     chunk_size = 3
     for i in range(0, len(topic_lines), chunk_size):
         chunk = topic_lines[i:i + chunk_size]
         send_message("\n".join(chunk), sender_id, interface)
-        # Add delay between chunks to prevent message loss on mesh network
-        if i + chunk_size < len(topic_lines):
-            time.sleep(3)
     
     # Send end message
-    time.sleep(3)
-    send_message("🏁 End of Topics 🏁", sender_id, interface)
+    send_message("🏁 End of Topics 🏁", sender_id, interface, droppable=True)
 
 
 def handle_channel_directory_command(sender_id, interface):
@@ -584,8 +681,7 @@ def handle_send_mail_command(sender_id, message, interface, bbs_nodes):
                              content, bbs_nodes, interface)
         send_message(f"Mail has been sent to {recipient_name}.", sender_id, interface)
 
-        notification_message = f"You have a new mail message from {sender_short_name}. Check your mailbox by responding to this message with CM."
-        send_message(notification_message, recipient_id, interface)
+        notify_mail_recipient(sender_id, sender_short_name, recipient_id, recipient_name, interface)
 
     except Exception as e:
         logging.error(f"Error processing send mail command: {e}")
@@ -594,19 +690,8 @@ def handle_send_mail_command(sender_id, message, interface, bbs_nodes):
 
 def handle_check_mail_command(sender_id, interface):
     try:
-        sender_node_id = get_node_id_from_num(sender_id, interface)
-        mail = get_mail(sender_node_id)
-        if not mail:
+        if not send_mail_page(sender_id, interface, {'command': 'CHECK_MAIL', 'step': 1}):
             send_message("You have no new messages.", sender_id, interface)
-            return
-
-        response = "📬 You have the following messages:\n"
-        for i, msg in enumerate(mail):
-            response += f"{i + 1:02d}. From: {msg[1]}, Subject: {msg[2]}\n"
-        response += "\nPlease reply with the number of the message you want to read."
-        send_message(response, sender_id, interface)
-
-        update_user_state(sender_id, {'command': 'CHECK_MAIL', 'step': 1, 'mail': mail})
 
     except Exception as e:
         logging.error(f"Error processing check mail command: {e}")
@@ -615,20 +700,24 @@ def handle_check_mail_command(sender_id, interface):
 
 def handle_read_mail_command(sender_id, message, state, interface):
     try:
-        mail = state.get('mail', [])
-        message_number = int(message) - 1
+        choice = message.lower().strip()
+        if choice in ('n', 'p') and 'first' in state:
+            send_mail_page(sender_id, interface, state, choice)
+            return
 
-        if message_number < 0 or message_number >= len(mail):
+        mail_id = int(message)
+        sender_node_id = get_node_id_from_num(sender_id, interface)
+        mail = get_mail_content(mail_id, sender_node_id)
+        if mail is None:
             send_message("Invalid message number. Please try again.", sender_id, interface)
             return
 
-        mail_id = mail[message_number][0]
-        sender_node_id = get_node_id_from_num(sender_id, interface)
-        sender, date, subject, content, unique_id = get_mail_content(mail_id, sender_node_id)
+        sender, date, subject, content, unique_id = mail
         response = f"Date: {date}\nFrom: {sender}\nSubject: {subject}\n\n{content}"
         send_message(response, sender_id, interface)
+        mark_mail_read(mail_id)
         send_message("What would you like to do with this message?\n[K]eep  [D]elete  [R]eply", sender_id, interface)
-        update_user_state(sender_id, {'command': 'CHECK_MAIL', 'step': 2, 'mail_id': mail_id, 'unique_id': unique_id, 'sender': sender, 'subject': subject, 'content': content})
+        update_user_state(sender_id, {'command': 'CHECK_MAIL', 'step': 2, 'mail_id': mail_id, 'unique_id': unique_id, 'sender': sender, 'subject': subject})
 
     except ValueError:
         send_message("Invalid input. Please enter a valid message number.", sender_id, interface)
@@ -694,18 +783,9 @@ def handle_check_bulletin_command(sender_id, message, interface):
         board_name = parts[1].strip().capitalize() #get board name from quick command and capitalize it
         board_name = boards[next(key for key, value in boards.items() if value == board_name)] #search for board name in list
 
-        bulletins = get_bulletins(board_name)
-        if not bulletins:
+        if not send_bulletin_page(sender_id, interface, board_name,
+                                  {'command': 'CHECK_BULLETIN', 'step': 1, 'board_name': board_name}):
             send_message(f"No bulletins available on {board_name} board.", sender_id, interface)
-            return
-
-        response = f"📰 Bulletins on {board_name} board:\n"
-        for i, bulletin in enumerate(bulletins):
-            response += f"[{i+1:02d}] Subject: {bulletin[1]}, From: {bulletin[2]}, Date: {bulletin[3]}\n"
-        response += "\nPlease reply with the number of the bulletin you want to read."
-        send_message(response, sender_id, interface)
-
-        update_user_state(sender_id, {'command': 'CHECK_BULLETIN', 'step': 1, 'board_name': board_name, 'bulletins': bulletins})
 
     except Exception as e:
         logging.error(f"Error processing check bulletin command: {e}")
@@ -713,17 +793,20 @@ def handle_check_bulletin_command(sender_id, message, interface):
 
 def handle_read_bulletin_command(sender_id, message, state, interface):
     try:
-        bulletins = state.get('bulletins', [])
-        message_number = int(message) - 1
+        choice = message.lower().strip()
+        if choice in ('n', 'p') and 'first' in state:
+            send_bulletin_page(sender_id, interface, state['board_name'], state, choice)
+            return
 
-        if message_number < 0 or message_number >= len(bulletins):
+        bulletin_id = int(message)
+        reply = bulletin_reply(bulletin_id, interface)
+        if reply is None:
             send_message("Invalid bulletin number. Please try again.", sender_id, interface)
             return
 
-        bulletin_id = bulletins[message_number][0]
-        sender, date, subject, content, unique_id = get_bulletin_content(bulletin_id)
-        response = f"Date: {date}\nFrom: {sender}\nSubject: {subject}\n\n{content}"
-        send_message(response, sender_id, interface)
+        text, chunks = reply
+        send_message(text, sender_id, interface, chunks=chunks)
+        mark_bulletin_read(get_node_id_from_num(sender_id, interface), state['board_name'], bulletin_id)
 
         update_user_state(sender_id, None)
 
@@ -734,6 +817,42 @@ def handle_read_bulletin_command(sender_id, message, state, interface):
         send_message("Error processing read bulletin command.", sender_id, interface)
 
 
+def handle_search_command(sender_id, message, interface):
+    try:
+        parts = message.split(",,", 2)
+        if len(parts) != 3 or not parts[2].strip():
+            send_message("Search Quick Command format:\nSR,,{board_name or mail},,{words}", sender_id, interface)
+            return
+
+        _, board_name, terms = parts
+        board_name = board_name.strip().capitalize()
+        if board_name == 'Mail':
+            results = search_mail(get_node_id_from_num(sender_id, interface), terms)
+            lines = [f"[{row[0]}] {row[1]}: {row[2]}" for row in results]
+            state = {'command': 'CHECK_MAIL', 'step': 1}
+        elif board_name in ("General", "Info", "News", "Urgent"):
+            results = search_bulletins(board_name, terms)
+            lines = [f"[{row[0]}] {row[1]} ({row[2]})" for row in results]
+            state = {'command': 'CHECK_BULLETIN', 'step': 1, 'board_name': board_name}
+        else:
+            send_message(f"Unknown board '{board_name}'. Use General, Info, News, Urgent or Mail.", sender_id, interface)
+            return
+
+        if not results:
+            send_message(f"No matches for '{terms.strip()}' in {board_name}.", sender_id, interface)
+            return
+
+        header = f"🔎 {board_name} matches:"
+        footer = "Reply with a number to read."
+        first, last = fit_lines(interface, header, lines, "\n" + footer)
+        send_message("\n".join([header] + lines[first:last + 1] + [footer]), sender_id, interface)
+        update_user_state(sender_id, state)
+
+    except Exception as e:
+        logging.error(f"Error processing search command: {e}")
+        send_message("Error processing search command.", sender_id, interface)
+
+
 def handle_post_channel_command(sender_id, message, interface):
     try:
         parts = message.split("|", 3)
@@ -764,7 +883,7 @@ def handle_check_channel_command(sender_id, interface):
         response += "\nPlease reply with the number of the channel you want to view."
         send_message(response, sender_id, interface)
 
-        update_user_state(sender_id, {'command': 'CHECK_CHANNEL', 'step': 1, 'channels': channels})
+        update_user_state(sender_id, {'command': 'CHECK_CHANNEL', 'step': 1})
 
     except Exception as e:
         logging.error(f"Error processing check channel command: {e}")
@@ -773,7 +892,7 @@ def handle_check_channel_command(sender_id, interface):
 
 def handle_read_channel_command(sender_id, message, state, interface):
     try:
-        channels = state.get('channels', [])
+        channels = get_channels()
         message_number = int(message) - 1
 
         if message_number < 0 or message_number >= len(channels):
@@ -806,7 +925,7 @@ def handle_list_channels_command(sender_id, interface):
         response += "\nPlease reply with the number of the channel you want to view."
         send_message(response, sender_id, interface)
 
-        update_user_state(sender_id, {'command': 'LIST_CHANNELS', 'step': 1, 'channels': channels})
+        update_user_state(sender_id, {'command': 'LIST_CHANNELS', 'step': 1})
 
     except Exception as e:
         logging.error(f"Error processing list channels command: {e}")
@@ -815,7 +934,7 @@ def handle_list_channels_command(sender_id, interface):
 
 def handle_quick_help_command(sender_id, interface):
     response = ("✈️QUICK COMMANDS✈️\nSend command below for usage info:\nSM,, - Send "
-                "Mail\nCM - Check Mail\nPB,, - Post Bulletin\nCB,, - Check Bulletins\nTT - Top MQTT Topics\n"
+                "Mail\nCM - Check Mail\nPB,, - Post Bulletin\nCB,, - Check Bulletins\nSR,, - Search\nTT - Top MQTT Topics\n"
                 "WX - Weather (WX or WX,location)\n")
     send_message(response, sender_id, interface)
 
@@ -862,7 +981,6 @@ def handle_announcement_command(sender_id, interface):
         
         # Send header message first
         send_message("📢 ANNOUNCEMENT 📢\nSelect a channel to broadcast to:", sender_id, interface)
-        time.sleep(3)
         
         # Split channels into two messages
         mid_point = (len(channels) + 1) // 2
@@ -877,7 +995,6 @@ def handle_announcement_command(sender_id, interface):
 
             response1 += f"[{channel['index']}] {display_name}\n"
         send_message(response1.strip(), sender_id, interface)
-        time.sleep(3)
         
         # Second half of channels
         response2 = ""
@@ -888,12 +1005,11 @@ def handle_announcement_command(sender_id, interface):
                 display_name = channel['name']
             response2 += f"[{channel['index']}] {display_name}\n"
         send_message(response2.strip(), sender_id, interface)
-        time.sleep(3)
         
         # Send instructions as separate message
         send_message("Reply with channel number or X to cancel", sender_id, interface)
         
-        update_user_state(sender_id, {'command': 'ANNOUNCEMENT', 'step': 1, 'channels': channels})
+        update_user_state(sender_id, {'command': 'ANNOUNCEMENT', 'step': 1})
         
     except Exception as e:
         logging.error(f"Error in announcement command: {e}")
@@ -915,7 +1031,7 @@ def handle_announcement_steps(sender_id, message, step, state, interface):
             
             try:
                 channel_idx = int(message.strip())
-                channels = state.get('channels', [])
+                channels = get_channel_list(interface)
                 
                 # Validate channel selection
                 selected_channel = next((ch for ch in channels if ch['index'] == channel_idx), None)
@@ -974,36 +1090,19 @@ def handle_announcement_steps(sender_id, message, step, state, interface):
                 channel_idx = state.get('channel_idx')
                 announcement_text = state.get('message', '')
                 
-                # Send the announcement
-                from meshtastic import BROADCAST_NUM
-                
-                # Split into chunks if needed
-                max_payload_size = 200
-                chunks = [announcement_text[i:i + max_payload_size] 
-                         for i in range(0, len(announcement_text), max_payload_size)]
-                
-                logging.info(f"Sending announcement to channel {channel_idx} in {len(chunks)} chunk(s)")
-                
-                for i, chunk in enumerate(chunks):
-                    try:
-                        interface.sendText(
-                            text=chunk,
-                            destinationId=BROADCAST_NUM,
-                            channelIndex=channel_idx,
-                            wantAck=False,
-                            wantResponse=False
-                        )
-                        logging.info(f"Sent announcement chunk {i+1}/{len(chunks)}")
-                        
-                        if i < len(chunks) - 1:
-                            time.sleep(2)
-                    except Exception as e:
-                        logging.error(f"Error sending announcement chunk {i+1}: {e}")
-                        send_message(f"❌ Error sending announcement: {e}", sender_id, interface)
-                        update_user_state(sender_id, None)
-                        return
+                # Queue the announcement; the transmit scheduler chunks it and
+                # charges it against the airtime budget like any other packet
+                logging.info(f"Queueing announcement to channel {channel_idx}")
+                get_transmit_scheduler(interface).enqueue(
+                    announcement_text,
+                    BROADCAST_NUM,
+                    channel_index=channel_idx,
+                    want_ack=False,
+                    label=f"channel {channel_idx}",
+                    lane='broadcast'
+                )
                 
-                send_message("✅ Announcement sent successfully!", sender_id, interface)
+                send_message("✅ Announcement queued for broadcast!", sender_id, interface)
                 update_user_state(sender_id, None)
                 
             elif message_lower == 'n':
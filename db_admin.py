@@ -1,48 +1,19 @@
 import os
-import sqlite3
-import threading
 
-thread_local = threading.local()
+import db_pool
+from migrations import migrate
+
 
 def get_db_connection():
-    if not hasattr(thread_local, 'connection'):
-        thread_local.connection = sqlite3.connect('bulletins.db')
-    return thread_local.connection
+    return db_pool.connection('bulletins.db')
 
 def initialize_database():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS bulletins (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    board TEXT NOT NULL,
-                    sender_short_name TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    subject TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    unique_id TEXT NOT NULL
-                )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS mail (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    sender TEXT NOT NULL,
-                    sender_short_name TEXT NOT NULL,
-                    recipient TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    subject TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    unique_id TEXT NOT NULL
-                );''')
-    c.execute('''CREATE TABLE IF NOT EXISTS channels (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    url TEXT NOT NULL
-                );''')
-    conn.commit()
+    with get_db_connection() as conn:
+        migrate(conn, 'bulletins')
 
 def list_bulletins():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, board, sender_short_name, date, subject, unique_id FROM bulletins")
-    bulletins = c.fetchall()
+    with get_db_connection() as conn:
+        bulletins = conn.execute("SELECT id, board, sender_short_name, date, subject, unique_id FROM bulletins ORDER BY created_at, id").fetchall()
     if bulletins:
         print_bold("Bulletins:")
         for bulletin in bulletins:
@@ -53,10 +24,8 @@ def list_bulletins():
     return bulletins
 
 def list_mail():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, sender, sender_short_name, recipient, date, subject, unique_id FROM mail")
-    mail = c.fetchall()
+    with get_db_connection() as conn:
+        mail = conn.execute("SELECT id, sender, sender_short_name, recipient, date, subject, unique_id FROM mail ORDER BY created_at, id").fetchall()
     if mail:
         print_bold("Mail:")
         for mail in mail:
@@ -67,10 +36,8 @@ def list_mail():
     return mail
 
 def list_channels():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, name, url FROM channels")
-    channels = c.fetchall()
+    with get_db_connection() as conn:
+        channels = conn.execute("SELECT id, name, url FROM channels").fetchall()
     if channels:
         print_bold("Channels:")
         for channel in channels:
@@ -88,11 +55,10 @@ def delete_bulletin():
             print_bold("Deletion cancelled.")
             print_separator()
             return
-        conn = get_db_connection()
-        c = conn.cursor()
-        for bulletin_id in bulletin_ids:
-            c.execute("DELETE FROM bulletins WHERE id = ?", (bulletin_id.strip(),))
-        conn.commit()
+        with get_db_connection() as conn:
+            for bulletin_id in bulletin_ids:
+                conn.execute("DELETE FROM bulletins WHERE id = ?", (bulletin_id.strip(),))
+            conn.commit()
         print_bold(f"Bulletin(s) with ID(s) {', '.join(bulletin_ids)} deleted.")
         print_separator()
 
@@ -104,11 +70,10 @@ def delete_mail():
             print_bold("Deletion cancelled.")
             print_separator()
             return
-        conn = get_db_connection()
-        c = conn.cursor()
-        for mail_id in mail_ids:
-            c.execute("DELETE FROM mail WHERE id = ?", (mail_id.strip(),))
-        conn.commit()
+        with get_db_connection() as conn:
+            for mail_id in mail_ids:
+                conn.execute("DELETE FROM mail WHERE id = ?", (mail_id.strip(),))
+            conn.commit()
         print_bold(f"Mail with ID(s) {', '.join(mail_ids)} deleted.")
         print_separator()
 
@@ -120,14 +85,32 @@ def delete_channel():
             print_bold("Deletion cancelled.")
             print_separator()
             return
-        conn = get_db_connection()
-        c = conn.cursor()
-        for channel_id in channel_ids:
-            c.execute("DELETE FROM channels WHERE id = ?", (channel_id.strip(),))
-        conn.commit()
+        with get_db_connection() as conn:
+            for channel_id in channel_ids:
+                conn.execute("DELETE FROM channels WHERE id = ?", (channel_id.strip(),))
+            conn.commit()
         print_bold(f"Channel(s) with ID(s) {', '.join(channel_ids)} deleted.")
         print_separator()
 
+def enable_incremental_vacuum():
+    print_bold("This runs a full VACUUM, which locks the database and can take minutes on large files.")
+    print_bold("Stop the BBS before continuing.")
+    if input_bold("Continue? (y/n): ").strip().lower() != 'y':
+        print_bold("Cancelled.")
+        print_separator()
+        return
+    for db_path in ('bulletins.db', 'js8call.db'):
+        if not os.path.exists(db_path):
+            continue
+        with db_pool.connection(db_path) as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                print_bold(f"{db_path} already uses incremental vacuum.")
+                continue
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        print_bold(f"{db_path} now uses incremental vacuum.")
+    print_separator()
+
 def display_menu():
     print("Menu:")
     print("1. List Bulletins")
@@ -136,7 +119,8 @@ def display_menu():
     print("4. Delete Bulletins")
     print("5. Delete Mail")
     print("6. Delete Channels")
-    print("7. Exit")
+    print("7. Enable Incremental Vacuum")
+    print("8. Exit")
 
 def display_banner():
     banner = """
@@ -186,6 +170,8 @@ def main():
         elif choice == '6':
             delete_channel()
         elif choice == '7':
+            enable_incremental_vacuum()
+        elif choice == '8':
             break
         else:
             print_bold("Invalid choice. Please try again.")
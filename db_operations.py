@@ -1,11 +1,13 @@
 import logging
-import sqlite3
-import threading
 import uuid
 from datetime import datetime
 
 from meshtastic import BROADCAST_NUM
 
+import db_pool
+from cache import ResultCache
+from db_pool import now_ms
+from migrations import migrate
 from utils import (
     send_bulletin_to_bbs_nodes,
     send_delete_bulletin_to_bbs_nodes,
@@ -14,141 +16,265 @@ from utils import (
 )
 
 
-thread_local = threading.local()
+DB_PATH = 'bulletins.db'
+
+# Bulletin listings and bodies, shared by everyone reading the same board.
+# Tagged "board:<name>" (plus "boards") and "bulletin:<id>" for invalidation.
+bulletin_cache = ResultCache('bulletin_cache')
+
+# Rows fetched per listing page; callers trim the page further to fit one packet.
+PAGE_SIZE = 8
+
+# Urgent bulletins older than this (e.g. caught up by anti-entropy) are stored without a group notice.
+URGENT_NOTICE_MAX_AGE_MS = 3600 * 1000
+
+# Rows already stored, or deleted here before (tombstoned), are skipped.
+INSERT_BULLETIN = ("INSERT INTO bulletins (board, sender_short_name, date, subject, content, unique_id, created_at) "
+                   "SELECT ?1, ?2, ?3, ?4, ?5, ?6, ?7 WHERE NOT EXISTS (SELECT 1 FROM tombstones WHERE unique_id = ?6) "
+                   "ON CONFLICT(unique_id) DO NOTHING")
+INSERT_MAIL = ("INSERT INTO mail (sender, sender_short_name, recipient, date, subject, content, unique_id, created_at) "
+               "SELECT ?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8 WHERE NOT EXISTS (SELECT 1 FROM tombstones WHERE unique_id = ?7) "
+               "ON CONFLICT(unique_id) DO NOTHING")
+# The delete triggers leave one as well; this covers deletes of items that never arrived.
+INSERT_TOMBSTONE = "INSERT OR IGNORE INTO tombstones (kind, unique_id, deleted_at) VALUES (?, ?, ?)"
+
+
+def _display_date(created_at):
+    """The local-time date string shown to users for an epoch-millisecond timestamp."""
+    return datetime.fromtimestamp(created_at / 1000).strftime('%Y-%m-%d %H:%M')
 
 def get_db_connection():
-    if not hasattr(thread_local, 'connection'):
-        thread_local.connection = sqlite3.connect('bulletins.db')
-    return thread_local.connection
+    """Borrow a pooled bulletins.db connection for the duration of a with block."""
+    return db_pool.connection(DB_PATH)
 
 def initialize_database():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS bulletins (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    board TEXT NOT NULL,
-                    sender_short_name TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    subject TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    unique_id TEXT NOT NULL
-                )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS mail (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    sender TEXT NOT NULL,
-                    sender_short_name TEXT NOT NULL,
-                    recipient TEXT NOT NULL,
-                    date TEXT NOT NULL,
-                    subject TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    unique_id TEXT NOT NULL
-                );''')
-    c.execute('''CREATE TABLE IF NOT EXISTS channels (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    url TEXT NOT NULL
-                );''')
-    conn.commit()
+    with get_db_connection() as conn:
+        migrate(conn, 'bulletins')
     print("Database schema initialized.")
 
 def add_channel(name, url, bbs_nodes=None, interface=None):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("INSERT INTO channels (name, url) VALUES (?, ?)", (name, url))
-    conn.commit()
+    with get_db_connection() as conn:
+        conn.execute("INSERT INTO channels (name, url) VALUES (?, ?)", (name, url))
+        conn.commit()
 
     if bbs_nodes and interface:
         send_channel_to_bbs_nodes(name, url, bbs_nodes, interface)
 
 
 def get_channels():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT name, url FROM channels")
-    return c.fetchall()
+    with get_db_connection() as conn:
+        return conn.execute("SELECT name, url FROM channels ORDER BY id").fetchall()
 
 
 
-def add_bulletin(board, sender_short_name, subject, content, bbs_nodes, interface, unique_id=None):
-    conn = get_db_connection()
-    c = conn.cursor()
-    date = datetime.now().strftime('%Y-%m-%d %H:%M')
+def add_bulletin(board, sender_short_name, subject, content, bbs_nodes, interface, unique_id=None, created_at=None):
+    created_at = created_at or now_ms()
     if not unique_id:
         unique_id = str(uuid.uuid4())
-    c.execute(
-        "INSERT INTO bulletins (board, sender_short_name, date, subject, content, unique_id) VALUES (?, ?, ?, ?, ?, ?)",
-        (board, sender_short_name, date, subject, content, unique_id))
-    conn.commit()
+    with get_db_connection() as conn:
+        c = conn.execute(INSERT_BULLETIN, (board, sender_short_name, _display_date(created_at), subject, content, unique_id,
+                                           created_at))
+        conn.commit()
+    return _bulletin_added(c.rowcount, board, sender_short_name, subject, content, unique_id, created_at, bbs_nodes,
+                           interface)
+
+
+def add_bulletin_batched(batcher, board, sender_short_name, subject, content, interface, unique_id, created_at=None):
+    """Store a bulletin received from a peer BBS through the write batcher; the urgent notice follows the commit."""
+    created_at = created_at or now_ms()
+    batcher.submit(INSERT_BULLETIN, (board, sender_short_name, _display_date(created_at), subject, content, unique_id,
+                                     created_at),
+                   lambda rowcount: _bulletin_added(rowcount, board, sender_short_name, subject, content, unique_id,
+                                                    created_at, [], interface))
+
+
+def _bulletin_added(rowcount, board, sender_short_name, subject, content, unique_id, created_at, bbs_nodes, interface):
+    if rowcount == 0:
+        logging.info(f"Bulletin {unique_id} already exists or was deleted, skipping")
+        return unique_id
+    bulletin_cache.invalidate(f"board:{board.lower()}")
     if bbs_nodes and interface:
-        send_bulletin_to_bbs_nodes(board, sender_short_name, subject, content, unique_id, bbs_nodes, interface)
+        send_bulletin_to_bbs_nodes(board, sender_short_name, subject, content, unique_id, bbs_nodes, interface,
+                                   created_at=created_at)
 
     # New logic to send group chat notification for urgent bulletins
-    if board.lower() == "urgent":
+    if board.lower() == "urgent" and now_ms() - created_at < URGENT_NOTICE_MAX_AGE_MS:
         notification_message = f"💥NEW URGENT BULLETIN💥\nFrom: {sender_short_name}\nTitle: {subject}\nDM 'CB,,Urgent' to view"
         send_message(notification_message, BROADCAST_NUM, interface)
 
     return unique_id
 
 
-def get_bulletins(board):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, subject, sender_short_name, date, unique_id FROM bulletins WHERE board = ? COLLATE NOCASE", (board,))
-    return c.fetchall()
+def _keyset_page(conn, select, params, before, after, limit):
+    """
+    Run `select` (which must end in a WHERE clause and select created_at last)
+    as one page ordered newest first by (created_at, id). before is the
+    (created_at, id) cursor of a row to page older from and after one to page
+    newer from, so every page is an index range scan no matter how deep it is.
+    Returns (rows, more) where more says whether rows exist beyond the page in
+    the direction of travel.
+    """
+    if after is not None:
+        rows = conn.execute(f"{select} AND (created_at, id) > (?, ?) ORDER BY created_at ASC, id ASC LIMIT ?",
+                            params + tuple(after) + (limit + 1,)).fetchall()
+        return rows[:limit][::-1], len(rows) > limit
+    if before is not None:
+        rows = conn.execute(f"{select} AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT ?",
+                            params + tuple(before) + (limit + 1,)).fetchall()
+    else:
+        rows = conn.execute(f"{select} ORDER BY created_at DESC, id DESC LIMIT ?", params + (limit + 1,)).fetchall()
+    return rows[:limit], len(rows) > limit
+
+def page_cursor(row):
+    """The (created_at, id) keyset cursor of a row returned by a *_page function."""
+    return [row[-1], row[0]]
+
+def get_bulletins_page(board, before=None, after=None, limit=PAGE_SIZE):
+    def query():
+        with get_db_connection() as conn:
+            rows, more = _keyset_page(conn, "SELECT id, subject, sender_short_name, date, unique_id, created_at FROM bulletins "
+                                            "WHERE board = ? COLLATE NOCASE", (board,), before, after, limit)
+        return tuple(rows), more
+
+    key = ('page', board.lower(), before and tuple(before), after and tuple(after), limit)
+    return bulletin_cache.get_or_compute(key, query, tags=(f"board:{board.lower()}", "boards"))
+
+def _match_query(terms):
+    """Quote each search word so user input is never parsed as FTS5 syntax; words are ANDed and prefix-matched."""
+    words = terms.split()
+    return " ".join('"' + word.replace('"', '""') + '"*' for word in words) if words else None
+
+def search_bulletins(board, terms, limit=PAGE_SIZE):
+    """Best matches first for the words in `terms` on one board, as (id, subject, sender_short_name) rows."""
+    query = _match_query(terms)
+    if query is None:
+        return []
+    with get_db_connection() as conn:
+        return conn.execute("SELECT b.id, b.subject, b.sender_short_name FROM bulletins_fts "
+                            "JOIN bulletins b ON b.id = bulletins_fts.rowid "
+                            "WHERE bulletins_fts MATCH ? AND b.board = ? COLLATE NOCASE ORDER BY rank LIMIT ?",
+                            (query, board, limit)).fetchall()
+
+def get_board_counts(board, node_id):
+    """Return (total, unread) for a board from the trigger-maintained counters."""
+    with get_db_connection() as conn:
+        total = conn.execute("SELECT total FROM counters WHERE key = ?", (f"board:{board.lower()}",)).fetchone()
+        read = conn.execute("SELECT total FROM counters WHERE key = ?", (f"read:{node_id}:{board.lower()}",)).fetchone()
+    total = total[0] if total else 0
+    return total, max(0, total - (read[0] if read else 0))
+
+def mark_bulletin_read(node_id, board, bulletin_id):
+    """Record that node_id read a bulletin, provided it is on `board`."""
+    with get_db_connection() as conn:
+        conn.execute("INSERT OR IGNORE INTO bulletin_reads (node_id, bulletin_id) "
+                     "SELECT ?, id FROM bulletins WHERE id = ? AND board = ? COLLATE NOCASE",
+                     (node_id, bulletin_id, board))
+        conn.commit()
 
 def get_bulletin_content(bulletin_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT sender_short_name, date, subject, content, unique_id FROM bulletins WHERE id = ?", (bulletin_id,))
-    return c.fetchone()
+    def query():
+        with get_db_connection() as conn:
+            return conn.execute("SELECT sender_short_name, date, subject, content, unique_id FROM bulletins WHERE id = ?",
+                                (bulletin_id,)).fetchone()
+
+    return bulletin_cache.get_or_compute(('content', bulletin_id), query, tags=(f"bulletin:{bulletin_id}",))
 
 
+def delete_bulletin_batched(batcher, unique_id):
+    """Delete a bulletin named by a peer BBS, leaving a tombstone even if it has not arrived here yet."""
+    with get_db_connection() as conn:
+        row = conn.execute("SELECT id FROM bulletins WHERE unique_id = ?", (unique_id,)).fetchone()
+    tags = ("boards", f"bulletin:{row[0]}") if row else ("boards",)
+    batcher.submit("DELETE FROM bulletins WHERE unique_id = ?", (unique_id,),
+                   lambda rowcount: bulletin_cache.invalidate(*tags))
+    batcher.submit(INSERT_TOMBSTONE, ('bulletins', unique_id, now_ms()))
+
 def delete_bulletin(bulletin_id, bbs_nodes, interface):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("DELETE FROM bulletins WHERE id = ?", (bulletin_id,))
-    conn.commit()
-    send_delete_bulletin_to_bbs_nodes(bulletin_id, bbs_nodes, interface)
-
-def add_mail(sender_id, sender_short_name, recipient_id, subject, content, bbs_nodes, interface, unique_id=None):
-    conn = get_db_connection()
-    c = conn.cursor()
-    date = datetime.now().strftime('%Y-%m-%d %H:%M')
+    with get_db_connection() as conn:
+        row = conn.execute("SELECT unique_id FROM bulletins WHERE id = ?", (bulletin_id,)).fetchone()
+        if row is None:
+            logging.error(f"No bulletin found with id: {bulletin_id}")
+            return
+        conn.execute("DELETE FROM bulletins WHERE id = ?", (bulletin_id,))
+        conn.commit()
+    bulletin_cache.invalidate(f"bulletin:{bulletin_id}", "boards")
+    if bbs_nodes and interface:
+        send_delete_bulletin_to_bbs_nodes(row[0], bbs_nodes, interface)
+
+def add_mail(sender_id, sender_short_name, recipient_id, subject, content, bbs_nodes, interface, unique_id=None,
+             created_at=None):
+    created_at = created_at or now_ms()
     if not unique_id:
         unique_id = str(uuid.uuid4())
-    c.execute("INSERT INTO mail (sender, sender_short_name, recipient, date, subject, content, unique_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
-              (sender_id, sender_short_name, recipient_id, date, subject, content, unique_id))
-    conn.commit()
+    with get_db_connection() as conn:
+        c = conn.execute(INSERT_MAIL, (sender_id, sender_short_name, recipient_id, _display_date(created_at), subject,
+                                       content, unique_id, created_at))
+        conn.commit()
+    return _mail_added(c.rowcount, sender_id, sender_short_name, recipient_id, subject, content, unique_id, created_at,
+                       bbs_nodes, interface)
+
+def add_mail_batched(batcher, sender_id, sender_short_name, recipient_id, subject, content, unique_id, created_at=None):
+    """Store mail received from a peer BBS through the write batcher."""
+    created_at = created_at or now_ms()
+    batcher.submit(INSERT_MAIL, (sender_id, sender_short_name, recipient_id, _display_date(created_at), subject, content,
+                                 unique_id, created_at),
+                   lambda rowcount: _mail_added(rowcount, sender_id, sender_short_name, recipient_id, subject, content,
+                                                unique_id, created_at, [], None))
+
+def _mail_added(rowcount, sender_id, sender_short_name, recipient_id, subject, content, unique_id, created_at, bbs_nodes,
+                interface):
+    if rowcount == 0:
+        logging.info(f"Mail {unique_id} already exists or was deleted, skipping")
+        return unique_id
     if bbs_nodes and interface:
-        send_mail_to_bbs_nodes(sender_id, sender_short_name, recipient_id, subject, content, unique_id, bbs_nodes, interface)
+        send_mail_to_bbs_nodes(sender_id, sender_short_name, recipient_id, subject, content, unique_id, bbs_nodes, interface,
+                               created_at=created_at)
     return unique_id
 
-def get_mail(recipient_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT id, sender_short_name, subject, date, unique_id FROM mail WHERE recipient = ?", (recipient_id,))
-    return c.fetchall()
+def get_mail_page(recipient_id, before=None, after=None, limit=PAGE_SIZE):
+    with get_db_connection() as conn:
+        return _keyset_page(conn, "SELECT id, sender_short_name, subject, date, unique_id, created_at FROM mail "
+                                  "WHERE recipient = ?", (recipient_id,), before, after, limit)
+
+def get_mail_counts(recipient_id):
+    """Return (total, unread) for a mailbox from the trigger-maintained counters."""
+    with get_db_connection() as conn:
+        row = conn.execute("SELECT total, unread FROM counters WHERE key = ?", (f"mail:{recipient_id}",)).fetchone()
+    return row if row else (0, 0)
+
+def search_mail(recipient_id, terms, limit=PAGE_SIZE):
+    """Best matches first for the words in `terms` in one mailbox, as (id, sender_short_name, subject) rows."""
+    query = _match_query(terms)
+    if query is None:
+        return []
+    with get_db_connection() as conn:
+        return conn.execute("SELECT m.id, m.sender_short_name, m.subject FROM mail_fts "
+                            "JOIN mail m ON m.id = mail_fts.rowid "
+                            "WHERE mail_fts MATCH ? AND m.recipient = ? ORDER BY rank LIMIT ?",
+                            (query, recipient_id, limit)).fetchall()
+
+def mark_mail_read(mail_id):
+    with get_db_connection() as conn:
+        conn.execute("UPDATE mail SET is_read = 1 WHERE id = ? AND is_read = 0", (mail_id,))
+        conn.commit()
 
 def get_mail_content(mail_id, recipient_id):
     # TODO: ensure only recipient can read mail
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT sender_short_name, date, subject, content, unique_id FROM mail WHERE id = ? and recipient = ?", (mail_id, recipient_id,))
-    return c.fetchone()
+    with get_db_connection() as conn:
+        return conn.execute("SELECT sender_short_name, date, subject, content, unique_id FROM mail WHERE id = ? and recipient = ?",
+                            (mail_id, recipient_id,)).fetchone()
 
 def delete_mail(unique_id, recipient_id, bbs_nodes, interface):
-    conn = get_db_connection()
-    c = conn.cursor()
     try:
-        c.execute("SELECT recipient FROM mail WHERE unique_id = ?", (unique_id,))
-        result = c.fetchone()
-        if result is None:
-            logging.error(f"No mail found with unique_id: {unique_id}")
-            return  # Early exit if no matching mail found
-        recipient_id = result[0]
-        logging.info(f"Attempting to delete mail with unique_id: {unique_id} by {recipient_id}")
-        c.execute("DELETE FROM mail WHERE unique_id = ? and recipient = ?", (unique_id, recipient_id,))
-        conn.commit()
+        with get_db_connection() as conn:
+            result = conn.execute("SELECT recipient FROM mail WHERE unique_id = ?", (unique_id,)).fetchone()
+            if result is None:
+                logging.error(f"No mail found with unique_id: {unique_id}")
+                return  # Early exit if no matching mail found
+            recipient_id = result[0]
+            logging.info(f"Attempting to delete mail with unique_id: {unique_id} by {recipient_id}")
+            conn.execute("DELETE FROM mail WHERE unique_id = ? and recipient = ?", (unique_id, recipient_id,))
+            conn.commit()
         send_delete_mail_to_bbs_nodes(unique_id, bbs_nodes, interface)
         logging.info(f"Mail with unique_id: {unique_id} deleted and sync message sent.")
     except Exception as e:
@@ -156,11 +282,15 @@ def delete_mail(unique_id, recipient_id, bbs_nodes, interface):
         raise
 
 
+def delete_mail_batched(batcher, unique_id):
+    """Delete mail named by a peer BBS, leaving a tombstone even if it has not arrived here yet."""
+    batcher.submit("DELETE FROM mail WHERE unique_id = ?", (unique_id,))
+    batcher.submit(INSERT_TOMBSTONE, ('mail', unique_id, now_ms()))
+
+
 def get_sender_id_by_mail_id(mail_id):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT sender FROM mail WHERE id = ?", (mail_id,))
-    result = c.fetchone()
+    with get_db_connection() as conn:
+        result = conn.execute("SELECT sender FROM mail WHERE id = ?", (mail_id,)).fetchone()
     if result:
         return result[0]
     return None
@@ -0,0 +1,157 @@
+"""
+Shared SQLite connection handling for every module that touches a database.
+
+Connections are opened with WAL journaling, synchronous=NORMAL, a busy
+timeout and a larger page cache, so the BBS, db_admin.py and the MQTT
+monitor can read and write the same files without "database is locked"
+stalls. Each database path gets one bounded ConnectionPool. Connections are
+reused rather than reopened, which also keeps their prepared-statement
+caches warm.
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Threads besides the dispatch workers that hold a bulletins.db connection at
+# the same time: write batcher, sync outbox, retention and anti-entropy.
+BACKGROUND_CONNECTIONS = 4
+
+DEFAULT_SETTINGS = {
+    # Four dispatch workers (the [dispatch] default) plus the background threads.
+    'pool_size': 4 + BACKGROUND_CONNECTIONS,
+    'busy_timeout': 5000,
+    'cache_size': 8000,
+    'cached_statements': 256,
+    'synchronous': 'NORMAL',
+}
+
+_settings = dict(DEFAULT_SETTINGS)
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def configure(config):
+    """
+    Apply the [database] section of config.ini to pools created from now on.
+    pool_size defaults to one connection per [dispatch] worker plus one per
+    background thread.
+    """
+    pool_size = config.getint('dispatch', 'workers', fallback=4) + BACKGROUND_CONNECTIONS
+    _settings['pool_size'] = config.getint('database', 'pool_size', fallback=pool_size)
+    _settings['busy_timeout'] = config.getint('database', 'busy_timeout', fallback=DEFAULT_SETTINGS['busy_timeout'])
+    _settings['cache_size'] = config.getint('database', 'cache_size', fallback=DEFAULT_SETTINGS['cache_size'])
+    _settings['synchronous'] = config.get('database', 'synchronous', fallback=DEFAULT_SETTINGS['synchronous'])
+
+
+def now_ms():
+    """Current time as the epoch milliseconds stored in created_at-style columns."""
+    return int(time.time() * 1000)
+
+
+def open_connection(path, check_same_thread=False, **pragmas):
+    """
+    Open a tuned connection to `path`. Extra keyword arguments are applied as
+    additional PRAGMAs (e.g. wal_autocheckpoint=5000).
+    """
+    conn = sqlite3.connect(path, timeout=_settings['busy_timeout'] / 1000.0,
+                           cached_statements=_settings['cached_statements'],
+                           check_same_thread=check_same_thread)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={_settings['synchronous']}")
+    conn.execute(f"PRAGMA busy_timeout={int(_settings['busy_timeout'])}")
+    # A negative cache_size is in KiB rather than pages.
+    conn.execute(f"PRAGMA cache_size=-{int(_settings['cache_size'])}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+
+class ConnectionPool:
+    """
+    At most max_size open connections to one database file.
+
+    connection() hands out an idle connection (opening a new one while under
+    the limit) and takes it back when the block exits, rolling back anything
+    left uncommitted. When every connection is in use, callers wait up to the
+    busy timeout for one to be returned.
+    """
+
+    def __init__(self, path, max_size=4):
+        self.path = path
+        self.max_size = max(1, max_size)
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def _acquire(self):
+        timeout = _settings['busy_timeout'] / 1000.0
+        with self._cond:
+            while not self._idle and self._open >= self.max_size:
+                if not self._cond.wait(timeout):
+                    raise sqlite3.OperationalError(f"No free connection to {self.path} after {timeout:.1f}s")
+            if self._idle:
+                return self._idle.pop()
+            self._open += 1
+        try:
+            return open_connection(self.path)
+        except sqlite3.Error:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def close(self):
+        """Close the idle connections (used at shutdown)."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for conn in idle:
+            conn.close()
+
+
+def get_pool(path):
+    """Return the shared pool for the database at `path`."""
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(path)
+            if pool is None:
+                pool = _pools[path] = ConnectionPool(path, _settings['pool_size'])
+    return pool
+
+
+def connection(path):
+    """Borrow a pooled connection to `path` for the duration of a with block."""
+    return get_pool(path).connection()
+
+
+def close_all():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
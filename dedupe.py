@@ -0,0 +1,80 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+_dedupe_lock = threading.Lock()
+
+
+class PacketDeduplicator:
+    """
+    Remembers recently handled inbound packets so rebroadcasts and radio
+    retries of the same packet are only processed once.
+
+    Packets are keyed on (from, packet id). Sync messages are additionally
+    keyed on a hash of their text, since a peer BBS resending a bulletin or
+    mail produces a new packet id for the same content. User commands are not
+    content-hashed because users legitimately send the same text twice.
+
+    Keys live in an LRU of at most max_entries that also forgets entries after
+    ttl seconds, so memory use stays flat however busy the mesh is.
+    """
+
+    def __init__(self, max_entries=2048, ttl=600.0):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            max_entries=config.getint('dedupe', 'max_entries', fallback=2048),
+            ttl=config.getfloat('dedupe', 'ttl', fallback=600.0)
+        )
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _check_and_add(self, key, now):
+        expires_at = self._entries.get(key)
+        if expires_at is not None and expires_at > now:
+            self._entries.move_to_end(key)
+            return True
+        self._entries[key] = now + self.ttl
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return False
+
+    def is_duplicate(self, sender, packet_id, text=None, hash_content=False):
+        """Record the packet and return True if it was already seen within the TTL."""
+        now = time.monotonic()
+        keys = []
+        if packet_id:
+            keys.append((sender, packet_id))
+        if hash_content and text is not None:
+            keys.append((sender, hashlib.sha1(text.encode('utf-8')).digest()))
+        duplicate = False
+        with self._lock:
+            for key in keys:
+                # Record every key even after a hit, so each form is remembered.
+                if self._check_and_add(key, now):
+                    duplicate = True
+        metrics.increment('dedupe.hits' if duplicate else 'dedupe.misses')
+        metrics.set_gauge('dedupe.entries', len(self._entries))
+        return duplicate
+
+
+def get_deduplicator(interface):
+    """Return the deduplicator attached to the interface, creating a default one if needed."""
+    deduplicator = getattr(interface, 'deduplicator', None)
+    if deduplicator is None:
+        with _dedupe_lock:
+            deduplicator = getattr(interface, 'deduplicator', None)
+            if deduplicator is None:
+                deduplicator = PacketDeduplicator()
+                interface.deduplicator = deduplicator
+    return deduplicator
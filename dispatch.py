@@ -0,0 +1,146 @@
+import logging
+import threading
+import time
+from collections import deque
+
+import metrics
+
+_dispatcher_lock = threading.Lock()
+
+
+class InboundDispatcher:
+    """
+    Runs inbound message handlers on a bounded pool of worker threads.
+
+    Each task belongs to a key (the sender). Tasks with the same key run one
+    at a time in the order they were submitted, so a user's menu state and a
+    peer's sync stream are never processed out of order, while different
+    senders are handled in parallel. Senders take turns one task at a time, so
+    a peer flooding sync messages cannot starve interactive users.
+
+    At most max_pending tasks may be waiting. When the pool is full, submit()
+    blocks the caller (the radio's receive thread) for up to submit_timeout
+    seconds before the message is dropped.
+    """
+
+    def __init__(self, workers=4, max_pending=100, submit_timeout=5.0):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.submit_timeout = submit_timeout
+        self._senders = {}
+        self._ready = deque()
+        self._pending = 0
+        self._active = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = False
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            workers=config.getint('dispatch', 'workers', fallback=4),
+            max_pending=config.getint('dispatch', 'max_pending', fallback=100),
+            submit_timeout=config.getfloat('dispatch', 'submit_timeout', fallback=5.0)
+        )
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"dispatch-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        """Stop the workers, giving queued tasks up to `timeout` seconds to finish."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while (self._pending or self._active) and time.monotonic() < deadline:
+                self._cond.wait(0.1)
+            self._running = False
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    def pending(self):
+        return self._pending
+
+    def submit(self, key, func, *args, **kwargs):
+        """Queue func(*args, **kwargs) behind earlier tasks for key. Returns False if it was dropped."""
+        deadline = time.monotonic() + self.submit_timeout
+        with self._cond:
+            while self._pending >= self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    metrics.increment('dispatch.dropped')
+                    logging.warning(f"Inbound queue full ({self._pending} pending), dropping message from {key}")
+                    return False
+                self._cond.wait(remaining)
+
+            task = (func, args, kwargs, time.monotonic())
+            queue = self._senders.get(key)
+            if queue is None:
+                self._senders[key] = deque([task])
+                self._ready.append(key)
+            else:
+                # The sender is either already waiting in _ready or running; the
+                # worker running it puts it back in _ready when it finishes.
+                queue.append(task)
+            self._pending += 1
+            metrics.set_gauge('dispatch.pending', self._pending)
+            self._cond.notify_all()
+        return True
+
+    def _next_task(self):
+        with self._cond:
+            while self._running and not self._ready:
+                self._cond.wait()
+            if not self._running:
+                return None, None
+            key = self._ready.popleft()
+            task = self._senders[key].popleft()
+            self._pending -= 1
+            self._active += 1
+            metrics.set_gauge('dispatch.pending', self._pending)
+            return key, task
+
+    def _finish(self, key):
+        with self._cond:
+            self._active -= 1
+            if self._senders[key]:
+                self._ready.append(key)
+            else:
+                del self._senders[key]
+            self._cond.notify_all()
+
+    def _worker(self):
+        while True:
+            key, task = self._next_task()
+            if task is None:
+                return
+            func, args, kwargs, submitted_at = task
+            started_at = time.monotonic()
+            metrics.observe('dispatch.wait', started_at - submitted_at)
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                logging.error(f"Error handling message from {key}: {e}")
+            finally:
+                metrics.observe('dispatch.handle', time.monotonic() - started_at)
+                self._finish(key)
+
+
+def get_inbound_dispatcher(interface):
+    """Return the dispatcher attached to the interface, starting a default one if needed."""
+    dispatcher = getattr(interface, 'inbound_dispatcher', None)
+    if dispatcher is None:
+        with _dispatcher_lock:
+            dispatcher = getattr(interface, 'inbound_dispatcher', None)
+            if dispatcher is None:
+                dispatcher = InboundDispatcher()
+                dispatcher.start()
+                interface.inbound_dispatcher = dispatcher
+    return dispatcher
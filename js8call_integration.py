@@ -7,7 +7,9 @@ import logging
 
 from meshtastic import BROADCAST_NUM
 
+import db_pool
 from command_handlers import handle_help_command
+from migrations import migrate
 from utils import send_message, update_user_state
 
 config_file = 'config.ini'
@@ -46,47 +48,21 @@ class JS8CallClient:
 
         self.connected = False
         self.sock = None
-        self.db_conn = None
+        self.db_pool = None
         self.interface = interface
 
         if self.db_file:
-            self.db_conn = sqlite3.connect(self.db_file)
+            self.db_pool = db_pool.get_pool(self.db_file)
             self.create_tables()
         else:
             self.logger.info("JS8Call configuration not found. Skipping JS8Call integration.")
 
     def create_tables(self):
-        if not self.db_conn:
+        if not self.db_pool:
             return
 
-        with self.db_conn:
-            self.db_conn.execute('''
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    sender TEXT,
-                    receiver TEXT,
-                    message TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            self.db_conn.execute('''
-                CREATE TABLE IF NOT EXISTS groups (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    sender TEXT,
-                    groupname TEXT,
-                    message TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            self.db_conn.execute('''
-                CREATE TABLE IF NOT EXISTS urgent (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    sender TEXT,
-                    groupname TEXT,
-                    message TEXT,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+        with self.db_pool.connection() as conn:
+            migrate(conn, 'js8call')
         self.logger.info("Database tables created or verified.")
 
     def insert_message(self, table, sender, recipient, message):
@@ -117,16 +93,17 @@ class JS8CallClient:
         client.insert_message('urgent', sender='CALLSIGN1', receiver_or_group='UrgentGroupName', message='This is an urgent message.')
         """
 
-        if not self.db_conn:
+        if not self.db_pool:
             self.logger.error("Database connection is not available.")
             return
 
         try:
-            with self.db_conn:
-                self.db_conn.execute(f'''
+            with self.db_pool.connection() as conn:
+                conn.execute(f'''
                     INSERT INTO {table} (sender, { 'receiver' if table == 'messages' else 'groupname' }, message)
                     VALUES (?, ?, ?)
-                ''', (sender, receiver_or_group, message))
+                ''', (sender, recipient, message))
+                conn.commit()
         except sqlite3.Error as e:
             self.logger.error(f"Failed to insert message into {table} table: {e}")
 
@@ -242,23 +219,19 @@ def handle_js8call_steps(sender_id, message, step, interface, state):
 
 
 def handle_group_messages_command(sender_id, interface):
-    conn = sqlite3.connect('js8call.db')
-    c = conn.cursor()
-    c.execute("SELECT DISTINCT groupname FROM groups")
-    groups = c.fetchall()
+    with db_pool.connection('js8call.db') as conn:
+        groups = conn.execute("SELECT DISTINCT groupname FROM groups").fetchall()
     if groups:
         response = "Group Messages Menu:\n" + "\n".join([f"[{i}] {group[0]}" for i, group in enumerate(groups)])
         send_message(response, sender_id, interface)
-        update_user_state(sender_id, {'command': 'GROUP_MESSAGES', 'step': 1, 'groups': groups})
+        update_user_state(sender_id, {'command': 'GROUP_MESSAGES', 'step': 1, 'groups': [group[0] for group in groups]})
     else:
         send_message("No group messages available.", sender_id, interface)
         handle_js8call_command(sender_id, interface)
 
 def handle_station_messages_command(sender_id, interface):
-    conn = sqlite3.connect('js8call.db')
-    c = conn.cursor()
-    c.execute("SELECT sender, receiver, message, timestamp FROM messages")
-    messages = c.fetchall()
+    with db_pool.connection('js8call.db') as conn:
+        messages = conn.execute("SELECT sender, receiver, message, timestamp FROM messages").fetchall()
     if messages:
         response = "Station Messages:\n" + "\n".join([f"[{i+1}] {msg[0]} -> {msg[1]}: {msg[2]} ({msg[3]})" for i, msg in enumerate(messages)])
         send_message(response, sender_id, interface)
@@ -267,10 +240,8 @@ def handle_station_messages_command(sender_id, interface):
     handle_js8call_command(sender_id, interface)
 
 def handle_urgent_messages_command(sender_id, interface):
-    conn = sqlite3.connect('js8call.db')
-    c = conn.cursor()
-    c.execute("SELECT sender, groupname, message, timestamp FROM urgent")
-    messages = c.fetchall()
+    with db_pool.connection('js8call.db') as conn:
+        messages = conn.execute("SELECT sender, groupname, message, timestamp FROM urgent").fetchall()
     if messages:
         response = "Urgent Messages:\n" + "\n".join([f"[{i+1}] {msg[0]} -> {msg[1]}: {msg[2]} ({msg[3]})" for i, msg in enumerate(messages)])
         send_message(response, sender_id, interface)
@@ -282,12 +253,11 @@ def handle_group_message_selection(sender_id, message, step, state, interface):
     groups = state['groups']
     try:
         group_index = int(message)
-        groupname = groups[group_index][0]
+        groupname = groups[group_index]
 
-        conn = sqlite3.connect('js8call.db')
-        c = conn.cursor()
-        c.execute("SELECT sender, message, timestamp FROM groups WHERE groupname=?", (groupname,))
-        messages = c.fetchall()
+        with db_pool.connection('js8call.db') as conn:
+            messages = conn.execute("SELECT sender, message, timestamp FROM groups WHERE groupname=?",
+                                    (groupname,)).fetchall()
 
         if messages:
             response = f"Messages for group {groupname}:\n" + "\n".join([f"[{i+1}] {msg[0]}: {msg[1]} ({msg[2]})" for i, msg in enumerate(messages)])
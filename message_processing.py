@@ -1,7 +1,6 @@
 import logging
 
-from meshtastic import BROADCAST_NUM
-
+from anti_entropy import handle_sync_buckets, handle_sync_ids, handle_sync_root, handle_sync_want
 from command_handlers import (
     handle_mail_command, handle_bulletin_command, handle_help_command, handle_stats_command, handle_fortune_command,
     handle_bb_steps, handle_mail_steps, handle_stats_steps, handle_wall_of_shame_command, handle_weather_command,
@@ -9,11 +8,20 @@ from command_handlers import (
     handle_read_mail_command, handle_check_mail_command, handle_delete_mail_confirmation, handle_post_bulletin_command,
     handle_check_bulletin_command, handle_read_bulletin_command, handle_read_channel_command,
     handle_post_channel_command, handle_list_channels_command, handle_quick_help_command, handle_mqtt_topics_command,
-    handle_announcement_command, handle_announcement_steps
+    handle_announcement_command, handle_announcement_steps, handle_search_command
+)
+from db_operations import (
+    DB_PATH, add_bulletin_batched, add_mail_batched, delete_bulletin_batched, delete_mail_batched,
+    add_channel, now_ms
 )
-from db_operations import add_bulletin, add_mail, delete_bulletin, delete_mail, get_db_connection, add_channel
+from dedupe import get_deduplicator
+from dispatch import get_inbound_dispatcher
 from js8call_integration import handle_js8call_command, handle_js8call_steps, handle_group_message_selection
+from ratelimit import SenderRateLimiter, get_sender_rate_limiter
+from router import CommandRouter
+from sync_parts import PART_PREFIX, get_sync_part_buffer
 from utils import get_user_state, get_node_short_name, get_node_id_from_num, send_message
+from write_batcher import get_write_batcher
 
 main_menu_handlers = {
     "q": handle_quick_help_command,
@@ -57,139 +65,136 @@ board_action_handlers = {
     "x": handle_help_command
 }
 
-def process_message(sender_id, message, interface, is_sync_message=False):
-    state = get_user_state(sender_id)
-    message_lower = message.lower().strip()
-    message_strip = message.strip()
+def parse_sync_timestamp(parts, index):
+    """The optional trailing created_at field of a sync message, capped at the local clock; None if absent."""
+    try:
+        return min(int(parts[index]), now_ms()) if len(parts) > index else None
+    except ValueError:
+        return None
 
-    bbs_nodes = interface.bbs_nodes
 
-    # Handle repeated characters for single character commands using a prefix
-    # But exclude quick commands like WX
-    if len(message_lower) == 2 and message_lower[1] == 'x' and message_lower != 'wx':
-        message_lower = message_lower[0]
+def handle_sync_bulletin(message, interface):
+    parts = message.split("|")
+    board, sender_short_name, subject, content, unique_id = parts[1], parts[2], parts[3], parts[4], parts[5]
+    # The urgent notification is sent once the row is committed, and only for bulletins not seen before.
+    add_bulletin_batched(get_write_batcher(interface, DB_PATH), board, sender_short_name, subject, content, interface,
+                         unique_id, parse_sync_timestamp(parts, 6))
 
-    if is_sync_message:
-        if message.startswith("BULLETIN|"):
-            parts = message.split("|")
-            board, sender_short_name, subject, content, unique_id = parts[1], parts[2], parts[3], parts[4], parts[5]
-            add_bulletin(board, sender_short_name, subject, content, [], interface, unique_id=unique_id)
-
-            if board.lower() == "urgent":
-                notification_message = f"💥NEW URGENT BULLETIN💥\nFrom: {sender_short_name}\nTitle: {subject}\nDM 'CB,,Urgent' to view"
-                send_message(notification_message, BROADCAST_NUM, interface)
-        elif message.startswith("MAIL|"):
-            parts = message.split("|")
-            sender_id, sender_short_name, recipient_id, subject, content, unique_id = parts[1], parts[2], parts[3], parts[4], parts[5], parts[6]
-            add_mail(sender_id, sender_short_name, recipient_id, subject, content, [], interface, unique_id=unique_id)
-        elif message.startswith("DELETE_BULLETIN|"):
-            unique_id = message.split("|")[1]
-            delete_bulletin(unique_id, [], interface)
-        elif message.startswith("DELETE_MAIL|"):
-            unique_id = message.split("|")[1]
-            logging.info(f"Processing delete mail with unique_id: {unique_id}")
-            recipient_id = get_recipient_id_by_mail(unique_id)
-            delete_mail(unique_id, recipient_id, [], interface)
-        elif message.startswith("CHANNEL|"):
-            parts = message.split("|")
-            channel_name, channel_url = parts[1], parts[2]
-            add_channel(channel_name, channel_url)
+
+def handle_sync_mail(message, interface):
+    parts = message.split("|")
+    sender_id, sender_short_name, recipient_id, subject, content, unique_id = parts[1], parts[2], parts[3], parts[4], parts[5], parts[6]
+    add_mail_batched(get_write_batcher(interface, DB_PATH), sender_id, sender_short_name, recipient_id, subject, content,
+                     unique_id, parse_sync_timestamp(parts, 7))
+
+
+def handle_sync_delete_bulletin(message, interface):
+    unique_id = message.split("|")[1]
+    if unique_id.isdigit():
+        # Older peers sent their own row id, which means nothing here.
+        logging.info(f"Ignoring delete bulletin for peer-local id {unique_id}")
+        return
+    logging.info(f"Processing delete bulletin with unique_id: {unique_id}")
+    delete_bulletin_batched(get_write_batcher(interface, DB_PATH), unique_id)
+
+
+def handle_sync_delete_mail(message, interface):
+    unique_id = message.split("|")[1]
+    logging.info(f"Processing delete mail with unique_id: {unique_id}")
+    # Deleting by unique_id alone, in the same queue as the inserts, keeps a delete ordered after its mail.
+    delete_mail_batched(get_write_batcher(interface, DB_PATH), unique_id)
+
+
+def handle_sync_channel(message, interface):
+    parts = message.split("|")
+    channel_name, channel_url = parts[1], parts[2]
+    add_channel(channel_name, channel_url)
+
+
+def handle_sync_part(sender_id, message, interface):
+    complete = get_sync_part_buffer(interface).add(sender_id, message)
+    if complete is not None:
+        router.route_sync(complete, interface, sender_id)
+
+
+def handle_weather_quick_command(sender_id, message, interface):
+    # Parse WX command: WX, WX,location or WX location
+    if len(message) > 2 and message[2] in ', ':
+        location = message[3:].strip()
+        handle_weather_command(sender_id, interface, location)
     else:
-        if message_lower.startswith("sm,,"):
-            handle_send_mail_command(sender_id, message_strip, interface, bbs_nodes)
-        elif message_lower.startswith("cm"):
-            handle_check_mail_command(sender_id, interface)
-        elif message_lower.startswith("pb,,"):
-            handle_post_bulletin_command(sender_id, message_strip, interface, bbs_nodes)
-        elif message_lower.startswith("cb,,"):
-            handle_check_bulletin_command(sender_id, message_strip, interface)
-        elif message_lower.startswith("chp,,"):
-            handle_post_channel_command(sender_id, message_strip, interface)
-        elif message_lower.startswith("chl"):
-            handle_list_channels_command(sender_id, interface)
-        elif message_lower.startswith("tt"):
-            handle_mqtt_topics_command(sender_id, interface)
-        elif message_lower.startswith("wx"):
-            # Parse WX command: WX or WX,location
-            if len(message_strip) > 2 and message_strip[2] == ',':
-                location = message_strip[3:].strip()
-                handle_weather_command(sender_id, interface, location)
-            else:
-                handle_weather_command(sender_id, interface)
-        else:
-            if state and state['command'] == 'MENU':
-                menu_name = state['menu']
-                if menu_name == 'bbs':
-                    handlers = bbs_menu_handlers
-                elif menu_name == 'utilities':
-                    handlers = utilities_menu_handlers
-                else:
-                    handlers = main_menu_handlers
-            elif state and state['command'] == 'BULLETIN_MENU':
-                handlers = bulletin_menu_handlers
-            elif state and state['command'] == 'BULLETIN_ACTION':
-                handlers = board_action_handlers
-            elif state and state['command'] == 'JS8CALL_MENU':
-                handle_js8call_steps(sender_id, message, state['step'], interface, state)
-                return
-            elif state and state['command'] == 'GROUP_MESSAGES':
-                handle_group_message_selection(sender_id, message, state['step'], state, interface)
-                return
-            else:
-                handlers = main_menu_handlers
+        handle_weather_command(sender_id, interface)
+
+
+router = CommandRouter(fallback=handle_help_command)
+
+router.sync('BULLETIN', handle_sync_bulletin)
+router.sync('MAIL', handle_sync_mail)
+router.sync('DELETE_BULLETIN', handle_sync_delete_bulletin)
+router.sync('DELETE_MAIL', handle_sync_delete_mail)
+router.sync('CHANNEL', handle_sync_channel)
+# Digests repeat verbatim every interval, so they must not be dropped as duplicate content.
+router.sync('SYNC_ROOT', handle_sync_root, pass_sender=True, dedupe_content=False)
+router.sync('SYNC_BUCKETS', handle_sync_buckets, pass_sender=True, dedupe_content=False)
+router.sync('SYNC_IDS', handle_sync_ids, pass_sender=True, dedupe_content=False)
+router.sync('SYNC_WANT', handle_sync_want, pass_sender=True, dedupe_content=False)
+# A resent piece must reach the buffer even if an earlier copy was handled before it expired.
+router.sync(PART_PREFIX, handle_sync_part, pass_sender=True, dedupe_content=False)
+
+router.quick('sm', lambda sender_id, message, interface:
+            handle_send_mail_command(sender_id, message, interface, interface.bbs_nodes), separator=',,')
+router.quick('cm', lambda sender_id, message, interface: handle_check_mail_command(sender_id, interface))
+router.quick('pb', lambda sender_id, message, interface:
+            handle_post_bulletin_command(sender_id, message, interface, interface.bbs_nodes), separator=',,')
+router.quick('cb', handle_check_bulletin_command, separator=',,')
+router.quick('sr', handle_search_command, separator=',,')
+router.quick('chp', handle_post_channel_command, separator=',,')
+router.quick('chl', lambda sender_id, message, interface: handle_list_channels_command(sender_id, interface))
+router.quick('tt', lambda sender_id, message, interface: handle_mqtt_topics_command(sender_id, interface))
+router.quick('wx', handle_weather_quick_command, separator=(',', ' '), bare=True)
+
+router.menu('main', main_menu_handlers)
+router.menu('bbs', bbs_menu_handlers)
+router.menu('utilities', utilities_menu_handlers)
+router.menu('bulletin', bulletin_menu_handlers)
+router.menu('board_action', board_action_handlers, pass_state=True)
+router.menu_for('BULLETIN_MENU', 'bulletin')
+router.menu_for('BULLETIN_ACTION', 'board_action')
+
+router.step('JS8CALL_MENU', lambda sender_id, message, step, state, interface:
+            handle_js8call_steps(sender_id, message, step, interface, state), priority=True)
+router.step('GROUP_MESSAGES', handle_group_message_selection, priority=True)
+router.step('MAIL', lambda sender_id, message, step, state, interface:
+            handle_mail_steps(sender_id, message, step, state, interface, interface.bbs_nodes))
+router.step('BULLETIN', lambda sender_id, message, step, state, interface:
+            handle_bb_steps(sender_id, message, step, state, interface, interface.bbs_nodes))
+router.step('STATS', lambda sender_id, message, step, state, interface:
+            handle_stats_steps(sender_id, message, step, interface))
+router.step('CHANNEL_DIRECTORY', handle_channel_directory_steps)
+router.step('CHECK_MAIL', lambda sender_id, message, step, state, interface:
+            handle_read_mail_command(sender_id, message, state, interface), step=1)
+router.step('CHECK_MAIL', lambda sender_id, message, step, state, interface:
+            handle_delete_mail_confirmation(sender_id, message, state, interface, interface.bbs_nodes), step=2)
+router.step('CHECK_BULLETIN', lambda sender_id, message, step, state, interface:
+            handle_read_bulletin_command(sender_id, message, state, interface), step=1)
+router.step('CHECK_CHANNEL', lambda sender_id, message, step, state, interface:
+            handle_read_channel_command(sender_id, message, state, interface), step=1)
+router.step('LIST_CHANNELS', lambda sender_id, message, step, state, interface:
+            handle_read_channel_command(sender_id, message, state, interface), step=1)
+router.step('BULLETIN_POST', lambda sender_id, message, step, state, interface:
+            handle_bb_steps(sender_id, message, 4, state, interface, interface.bbs_nodes))
+router.step('BULLETIN_POST_CONTENT', lambda sender_id, message, step, state, interface:
+            handle_bb_steps(sender_id, message, 5, state, interface, interface.bbs_nodes))
+router.step('BULLETIN_READ', lambda sender_id, message, step, state, interface:
+            handle_bb_steps(sender_id, message, 3, state, interface, interface.bbs_nodes))
+router.step('ANNOUNCEMENT', handle_announcement_steps)
 
-            if message_lower == 'x':
-                # Reset to main menu state
-                handle_help_command(sender_id, interface)
-                return
 
-            if message_lower in handlers:
-                if state and state['command'] in ['BULLETIN_ACTION', 'BULLETIN_READ', 'BULLETIN_POST', 'BULLETIN_POST_CONTENT']:
-                    handlers[message_lower](sender_id, interface, state)
-                else:
-                    handlers[message_lower](sender_id, interface)
-            elif state:
-                command = state['command']
-                step = state['step']
-
-                if command == 'MAIL':
-                    handle_mail_steps(sender_id, message, step, state, interface, bbs_nodes)
-                elif command == 'BULLETIN':
-                    handle_bb_steps(sender_id, message, step, state, interface, bbs_nodes)
-                elif command == 'STATS':
-                    handle_stats_steps(sender_id, message, step, interface)
-                elif command == 'CHANNEL_DIRECTORY':
-                    handle_channel_directory_steps(sender_id, message, step, state, interface)
-                elif command == 'CHECK_MAIL':
-                    if step == 1:
-                        handle_read_mail_command(sender_id, message, state, interface)
-                    elif step == 2:
-                        handle_delete_mail_confirmation(sender_id, message, state, interface, bbs_nodes)
-                elif command == 'CHECK_BULLETIN':
-                    if step == 1:
-                        handle_read_bulletin_command(sender_id, message, state, interface)
-                elif command == 'CHECK_CHANNEL':
-                    if step == 1:
-                        handle_read_channel_command(sender_id, message, state, interface)
-                elif command == 'LIST_CHANNELS':
-                    if step == 1:
-                        handle_read_channel_command(sender_id, message, state, interface)
-                elif command == 'BULLETIN_POST':
-                    handle_bb_steps(sender_id, message, 4, state, interface, bbs_nodes)
-                elif command == 'BULLETIN_POST_CONTENT':
-                    handle_bb_steps(sender_id, message, 5, state, interface, bbs_nodes)
-                elif command == 'BULLETIN_READ':
-                    handle_bb_steps(sender_id, message, 3, state, interface, bbs_nodes)
-                elif command == 'JS8CALL_MENU':
-                    handle_js8call_steps(sender_id, message, step, interface, state)
-                elif command == 'GROUP_MESSAGES':
-                    handle_group_message_selection(sender_id, message, step, state, interface)
-                elif command == 'ANNOUNCEMENT':
-                    handle_announcement_steps(sender_id, message, step, state, interface)
-                else:
-                    handle_help_command(sender_id, interface)
-            else:
-                handle_help_command(sender_id, interface)
+def process_message(sender_id, message, interface, is_sync_message=False):
+    if is_sync_message:
+        router.route_sync(message, interface, sender_id)
+    else:
+        router.route(sender_id, message, interface, get_user_state(sender_id))
 
 
 def on_receive(packet, interface):
@@ -200,6 +205,13 @@ def on_receive(packet, interface):
             sender_id = packet['from']
             to_id = packet.get('to')
             sender_node_id = packet['fromId']
+            is_sync_message = router.is_sync(message_string)
+
+            hash_content = is_sync_message and router.dedupe_content(message_string)
+            if get_deduplicator(interface).is_duplicate(sender_id, packet.get('id'), message_string,
+                                                        hash_content=hash_content):
+                logging.info(f"Ignoring duplicate packet {packet.get('id')} from {sender_node_id}")
+                return
 
             sender_short_name = get_node_short_name(sender_node_id, interface)
             receiver_short_name = get_node_short_name(get_node_id_from_num(to_id, interface),
@@ -207,27 +219,25 @@ def on_receive(packet, interface):
             logging.info(f"Received message from user '{sender_short_name}' ({sender_node_id}) to {receiver_short_name}: {message_string}")
 
             bbs_nodes = interface.bbs_nodes
-            is_sync_message = any(message_string.startswith(prefix) for prefix in
-                                  ["BULLETIN|", "MAIL|", "DELETE_BULLETIN|", "DELETE_MAIL|"])
 
+            dispatcher = get_inbound_dispatcher(interface)
             if sender_node_id in bbs_nodes:
                 if is_sync_message:
-                    process_message(sender_id, message_string, interface, is_sync_message=True)
+                    dispatcher.submit(sender_id, process_message, sender_id, message_string, interface,
+                                      is_sync_message=True)
                 else:
                     logging.info("Ignoring non-sync message from known BBS node")
             elif to_id is not None and to_id != 0 and to_id != 255 and to_id == interface.myInfo.my_node_num:
-                process_message(sender_id, message_string, interface, is_sync_message=False)
+                decision = get_sender_rate_limiter(interface).check(sender_id)
+                if decision == SenderRateLimiter.NOTIFY:
+                    logging.info(f"Rate limiting user '{sender_short_name}' ({sender_node_id})")
+                    send_message("⏳ Too many commands, please slow down and try again shortly.", sender_id,
+                                 interface, droppable=True)
+                if decision != SenderRateLimiter.ALLOW:
+                    return
+                dispatcher.submit(sender_id, process_message, sender_id, message_string, interface,
+                                  is_sync_message=False)
             else:
                 logging.info("Ignoring message sent to group chat or from unknown node")
     except KeyError as e:
         logging.error(f"Error processing packet: {e}")
-
-def get_recipient_id_by_mail(unique_id):
-    # Fix for Mail Delete sync issue
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT recipient FROM mail WHERE unique_id = ?", (unique_id,))
-    result = c.fetchone()
-    if result:
-        return result[0]
-    return None
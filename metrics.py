@@ -0,0 +1,68 @@
+import logging
+import threading
+import time
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_timings = {}
+
+
+def increment(name, value=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name, value):
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name, value):
+    """Record a single observation (e.g. a latency in seconds) for a timing metric."""
+    with _lock:
+        timing = _timings.get(name)
+        if timing is None:
+            timing = _timings[name] = {'count': 0, 'total': 0.0, 'max': 0.0, 'last': 0.0}
+        timing['count'] += 1
+        timing['total'] += value
+        timing['last'] = value
+        if value > timing['max']:
+            timing['max'] = value
+
+
+def snapshot():
+    with _lock:
+        timings = {}
+        for name, timing in _timings.items():
+            timings[name] = dict(timing, avg=timing['total'] / timing['count'] if timing['count'] else 0.0)
+        return {
+            'counters': dict(_counters),
+            'gauges': dict(_gauges),
+            'timings': timings
+        }
+
+
+def log_snapshot():
+    data = snapshot()
+    parts = [f"{name}={value}" for name, value in sorted(data['counters'].items())]
+    parts += [f"{name}={value}" for name, value in sorted(data['gauges'].items())]
+    parts += [f"{name}(avg={timing['avg']:.2f}s max={timing['max']:.2f}s n={timing['count']})"
+              for name, timing in sorted(data['timings'].items())]
+    if parts:
+        logging.info(f"METRICS: {' '.join(parts)}")
+
+
+def start_reporter(interval):
+    """Log a metrics snapshot every `interval` seconds from a daemon thread (0 disables)."""
+    if interval <= 0:
+        return None
+
+    def report():
+        while True:
+            time.sleep(interval)
+            log_snapshot()
+
+    thread = threading.Thread(target=report, name="metrics-reporter", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,280 @@
+"""
+Versioned schema migrations for the BBS's SQLite databases.
+
+Each database has an ordered list of migration steps. The number of steps
+already applied is stored in the database itself with PRAGMA user_version,
+so starting up against an up-to-date database costs a single PRAGMA read.
+Pending steps run one at a time, each in its own transaction together with
+the user_version bump, so an interrupted upgrade never leaves a half-applied
+step behind.
+
+To change a schema, append a new step to the database's list; never edit or
+reorder steps that have already shipped. The first step of each list uses
+CREATE ... IF NOT EXISTS so databases created before migrations existed
+(user_version 0) upgrade in place.
+"""
+
+import logging
+import sqlite3
+
+
+def _bulletins_create_tables(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS bulletins (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    board TEXT NOT NULL,
+                    sender_short_name TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    unique_id TEXT NOT NULL
+                )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS mail (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sender TEXT NOT NULL,
+                    sender_short_name TEXT NOT NULL,
+                    recipient TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    unique_id TEXT NOT NULL
+                )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS channels (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    url TEXT NOT NULL
+                )''')
+
+
+def _bulletins_add_indexes(conn):
+    # Repeated sync could insert the same unique_id more than once; keep the
+    # oldest row so the unique index can be built.
+    for table in ('bulletins', 'mail'):
+        cursor = conn.execute(f"DELETE FROM {table} WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY unique_id)")
+        if cursor.rowcount > 0:
+            logging.info(f"Removed {cursor.rowcount} duplicate rows from {table}")
+        conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{table}_unique_id ON {table} (unique_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bulletins_board ON bulletins (board COLLATE NOCASE)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_mail_recipient ON mail (recipient)")
+
+
+def _bulletins_add_counters(conn):
+    # Per-board and per-recipient row counts kept current by triggers, so menu
+    # headers are a primary key lookup instead of a scan of the user's mail.
+    conn.execute("ALTER TABLE mail ADD COLUMN is_read INTEGER NOT NULL DEFAULT 0")
+    conn.execute('''CREATE TABLE IF NOT EXISTS counters (
+                    key TEXT PRIMARY KEY,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    unread INTEGER NOT NULL DEFAULT 0
+                ) WITHOUT ROWID''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS board_reads (
+                    node_id TEXT NOT NULL,
+                    board TEXT NOT NULL COLLATE NOCASE,
+                    last_read_id INTEGER NOT NULL,
+                    PRIMARY KEY (node_id, board)
+                ) WITHOUT ROWID''')
+    conn.execute("DELETE FROM counters")
+    conn.execute("INSERT INTO counters (key, total) SELECT 'board:' || lower(board), COUNT(*) FROM bulletins GROUP BY lower(board)")
+    conn.execute("INSERT INTO counters (key, total, unread) "
+                 "SELECT 'mail:' || recipient, COUNT(*), SUM(is_read = 0) FROM mail GROUP BY recipient")
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS bulletins_count_insert AFTER INSERT ON bulletins BEGIN
+                    INSERT INTO counters (key, total) VALUES ('board:' || lower(NEW.board), 1)
+                        ON CONFLICT(key) DO UPDATE SET total = total + 1;
+                END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS bulletins_count_delete AFTER DELETE ON bulletins BEGIN
+                    UPDATE counters SET total = total - 1 WHERE key = 'board:' || lower(OLD.board);
+                END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS mail_count_insert AFTER INSERT ON mail BEGIN
+                    INSERT INTO counters (key, total, unread) VALUES ('mail:' || NEW.recipient, 1, NEW.is_read = 0)
+                        ON CONFLICT(key) DO UPDATE SET total = total + 1, unread = unread + (NEW.is_read = 0);
+                END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS mail_count_delete AFTER DELETE ON mail BEGIN
+                    UPDATE counters SET total = total - 1, unread = unread - (OLD.is_read = 0)
+                        WHERE key = 'mail:' || OLD.recipient;
+                END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS mail_count_read AFTER UPDATE OF is_read ON mail
+                    WHEN OLD.is_read != NEW.is_read BEGIN
+                    UPDATE counters SET unread = unread + (NEW.is_read = 0) - (OLD.is_read = 0)
+                        WHERE key = 'mail:' || NEW.recipient;
+                END''')
+
+
+def _bulletins_add_search(conn):
+    # External-content FTS5 indexes over subject and content; the rows stay in
+    # bulletins/mail and triggers keep the indexes in step with every write.
+    for table in ('bulletins', 'mail'):
+        conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5("
+                     f"subject, content, content='{table}', content_rowid='id', tokenize='porter unicode61')")
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+                        INSERT INTO {table}_fts (rowid, subject, content) VALUES (NEW.id, NEW.subject, NEW.content);
+                    END''')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+                        INSERT INTO {table}_fts ({table}_fts, rowid, subject, content)
+                            VALUES ('delete', OLD.id, OLD.subject, OLD.content);
+                    END''')
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF subject, content ON {table} BEGIN
+                        INSERT INTO {table}_fts ({table}_fts, rowid, subject, content)
+                            VALUES ('delete', OLD.id, OLD.subject, OLD.content);
+                        INSERT INTO {table}_fts (rowid, subject, content) VALUES (NEW.id, NEW.subject, NEW.content);
+                    END''')
+        conn.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+
+
+def _bulletins_add_created_at(conn):
+    # Epoch milliseconds (UTC) alongside the local-time display date. Existing
+    # rows are backfilled from their minute-resolution date; ties and
+    # unparseable dates fall back to id order.
+    for table in ('bulletins', 'mail'):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN created_at INTEGER NOT NULL DEFAULT 0")
+        conn.execute(f"UPDATE {table} SET created_at = COALESCE(CAST(strftime('%s', date, 'utc') AS INTEGER) * 1000, 0)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_created_at ON {table} (created_at)")
+    conn.execute("DROP INDEX IF EXISTS idx_bulletins_board")
+    conn.execute("DROP INDEX IF EXISTS idx_mail_recipient")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bulletins_board_created_at ON bulletins (board COLLATE NOCASE, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_mail_recipient_created_at ON mail (recipient, created_at)")
+
+
+def _bulletins_add_tombstones(conn):
+    # Remember the unique_id of every deleted bulletin and mail so peer
+    # reconciliation does not bring deleted items back.
+    conn.execute('''CREATE TABLE IF NOT EXISTS tombstones (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    unique_id TEXT NOT NULL UNIQUE,
+                    deleted_at INTEGER NOT NULL
+                )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tombstones_deleted_at ON tombstones (deleted_at)")
+    for table in ('bulletins', 'mail'):
+        conn.execute(f'''CREATE TRIGGER IF NOT EXISTS {table}_tombstone AFTER DELETE ON {table} BEGIN
+                        INSERT OR IGNORE INTO tombstones (kind, unique_id, deleted_at)
+                            VALUES ('{table}', OLD.unique_id, CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER));
+                    END''')
+
+
+def _bulletins_add_sync_outbox(conn):
+    # Sync messages waiting for (or recently acknowledged by) each peer BBS.
+    conn.execute('''CREATE TABLE IF NOT EXISTS sync_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    peer TEXT NOT NULL,
+                    item_key TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    created_at INTEGER NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at INTEGER NOT NULL,
+                    delivered_at INTEGER,
+                    UNIQUE (peer, item_key)
+                )''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sync_outbox_pending ON sync_outbox (peer, id) "
+                 "WHERE delivered_at IS NULL")
+
+
+def _js8call_create_tables(conn):
+    for table, target in (('messages', 'receiver'), ('groups', 'groupname'), ('urgent', 'groupname')):
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sender TEXT,
+                {target} TEXT,
+                message TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+
+def _mqtt_counts_create_tables(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS topic_counts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            base_topic TEXT NOT NULL,
+            subtopic TEXT NOT NULL,
+            message_count INTEGER NOT NULL DEFAULT 0,
+            first_seen TEXT NOT NULL,
+            last_seen TEXT NOT NULL,
+            UNIQUE(base_topic, subtopic)
+        )
+        """
+    )
+
+
+def _bulletins_add_bulletin_reads(conn):
+    # One row per bulletin a node has read, replacing the per-board high-water
+    # mark, plus a trigger-maintained 'read:<node>:<board>' counter so a
+    # board's unread count is two primary key lookups.
+    conn.execute('''CREATE TABLE IF NOT EXISTS bulletin_reads (
+                    node_id TEXT NOT NULL,
+                    bulletin_id INTEGER NOT NULL,
+                    PRIMARY KEY (node_id, bulletin_id)
+                ) WITHOUT ROWID''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bulletin_reads_bulletin_id ON bulletin_reads (bulletin_id)")
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS bulletin_reads_count_insert AFTER INSERT ON bulletin_reads BEGIN
+                    INSERT INTO counters (key, total)
+                        SELECT 'read:' || NEW.node_id || ':' || lower(board), 1 FROM bulletins WHERE id = NEW.bulletin_id
+                        ON CONFLICT(key) DO UPDATE SET total = total + 1;
+                END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS bulletins_reads_delete AFTER DELETE ON bulletins BEGIN
+                    UPDATE counters SET total = total - 1 WHERE key IN (
+                        SELECT 'read:' || node_id || ':' || lower(OLD.board) FROM bulletin_reads WHERE bulletin_id = OLD.id);
+                    DELETE FROM bulletin_reads WHERE bulletin_id = OLD.id;
+                END''')
+    # Everything up to an old high-water mark counts as read.
+    conn.execute("INSERT OR IGNORE INTO bulletin_reads (node_id, bulletin_id) "
+                 "SELECT r.node_id, b.id FROM board_reads r JOIN bulletins b "
+                 "ON b.board = r.board COLLATE NOCASE AND b.id <= r.last_read_id")
+    conn.execute("DROP TABLE board_reads")
+
+
+def _sessions_create_tables(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS sessions (
+                    user_id INTEGER PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )''')
+
+
+MIGRATIONS = {
+    'bulletins': [
+        _bulletins_create_tables,
+        _bulletins_add_indexes,
+        _bulletins_add_counters,
+        _bulletins_add_search,
+        _bulletins_add_created_at,
+        _bulletins_add_tombstones,
+        _bulletins_add_sync_outbox,
+        _bulletins_add_bulletin_reads,
+    ],
+    'js8call': [
+        _js8call_create_tables,
+    ],
+    'mqtt_counts': [
+        _mqtt_counts_create_tables,
+    ],
+    'sessions': [
+        _sessions_create_tables,
+    ],
+}
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, database):
+    """Apply any pending migrations for `database` (a MIGRATIONS key). Returns the resulting version."""
+    steps = MIGRATIONS[database]
+    version = schema_version(conn)
+    if version >= len(steps):
+        return version
+
+    conn.commit()
+    for number, step in enumerate(steps[version:], start=version + 1):
+        try:
+            conn.execute("BEGIN")
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logging.error(f"Migration {number} ({step.__name__}) of {database} failed: {e}")
+            raise
+        logging.info(f"Migrated {database} database to version {number} ({step.__name__})")
+    return len(steps)
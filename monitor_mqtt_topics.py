@@ -13,6 +13,9 @@ from typing import Optional
 
 import paho.mqtt.client as mqtt
 
+from db_pool import open_connection
+from migrations import migrate
+
 
 def load_config(config_path: str = "config.ini") -> dict:
     """Load MQTT monitor configuration from config.ini file."""
@@ -113,29 +116,12 @@ def parse_args() -> argparse.Namespace:
 
 
 def create_connection(db_path: str) -> sqlite3.Connection:
-    conn = sqlite3.connect(db_path, check_same_thread=False)
-    conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA synchronous=NORMAL;")
     # Limit WAL file to ~20MB (5000 pages * 4KB default page size)
-    conn.execute("PRAGMA wal_autocheckpoint=5000;")
-    return conn
+    return open_connection(db_path, check_same_thread=False, wal_autocheckpoint=5000)
 
 
 def ensure_schema(conn: sqlite3.Connection) -> None:
-    conn.execute(
-        """
-        CREATE TABLE IF NOT EXISTS topic_counts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            base_topic TEXT NOT NULL,
-            subtopic TEXT NOT NULL,
-            message_count INTEGER NOT NULL DEFAULT 0,
-            first_seen TEXT NOT NULL,
-            last_seen TEXT NOT NULL,
-            UNIQUE(base_topic, subtopic)
-        )
-        """
-    )
-    conn.commit()
+    migrate(conn, "mqtt_counts")
 
 
 def normalize_base_topic(topic: str) -> str:
@@ -0,0 +1,184 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+
+_index_lock = threading.Lock()
+
+SNAPSHOT_VERSION = 1
+
+
+def node_id_for_num(node_num):
+    return f"!{node_num:08x}"
+
+
+class NodeIndex:
+    """
+    Hash indexes over the radio's NodeDB.
+
+    interface.nodes is keyed by node id, so finding a node by number or short
+    name means scanning every entry. The index keeps num -> id, id -> node and
+    lowercased shortName -> ids maps that are updated from meshtastic's
+    node-updated events, making every lookup O(1).
+
+    The index can be saved to and loaded from a compact gzipped snapshot so
+    that short names resolve immediately after a restart, before the radio
+    has streamed its NodeDB. Live entries replace snapshot entries as they
+    arrive.
+    """
+
+    def __init__(self, nodes=None):
+        self.lock = threading.Lock()
+        self.by_num = {}
+        self.by_id = {}
+        self.by_short_name = {}
+        self.dirty = False
+        if nodes:
+            self.rebuild(nodes)
+
+    def rebuild(self, nodes):
+        with self.lock:
+            self.by_num = {}
+            self.by_id = {}
+            self.by_short_name = {}
+            for node_id, node in list(nodes.items()):
+                self._add(node_id, node)
+
+    def merge(self, nodes):
+        """Add or replace entries from a NodeDB mapping without dropping existing ones."""
+        with self.lock:
+            for node_id, node in list(nodes.items()):
+                self._remove(node_id)
+                self._add(node_id, node)
+            self.dirty = True
+
+    def update(self, node):
+        node_id = node.get('user', {}).get('id')
+        if node_id is None and 'num' in node:
+            node_id = node_id_for_num(node['num'])
+        if node_id is None:
+            return
+        with self.lock:
+            self._remove(node_id)
+            self._add(node_id, node)
+            self.dirty = True
+
+    def _add(self, node_id, node):
+        self.by_id[node_id] = node
+        if 'num' in node:
+            self.by_num[node['num']] = node_id
+        short_name = node.get('user', {}).get('shortName')
+        if short_name:
+            self.by_short_name.setdefault(short_name.lower(), set()).add(node_id)
+
+    def _remove(self, node_id):
+        old = self.by_id.pop(node_id, None)
+        if old is None:
+            return
+        short_name = old.get('user', {}).get('shortName')
+        if short_name:
+            ids = self.by_short_name.get(short_name.lower())
+            if ids:
+                ids.discard(node_id)
+                if not ids:
+                    del self.by_short_name[short_name.lower()]
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def get(self, node_id):
+        return self.by_id.get(node_id)
+
+    def id_from_num(self, node_num):
+        return self.by_num.get(node_num)
+
+    def find_by_short_name(self, short_name):
+        ids = self.by_short_name.get(short_name.lower(), ())
+        return [(node_id, self.by_id[node_id]) for node_id in sorted(ids) if node_id in self.by_id]
+
+    def save(self, path):
+        """Write the index to a gzipped JSON snapshot, replacing the old file atomically."""
+        with self.lock:
+            rows = []
+            for node_id, node in self.by_id.items():
+                user = node.get('user', {})
+                rows.append([node.get('num'), node_id, user.get('shortName'), user.get('longName'),
+                             user.get('hwModel'), user.get('role'), node.get('lastHeard')])
+            self.dirty = False
+        data = {'version': SNAPSHOT_VERSION, 'saved_at': int(time.time()), 'nodes': rows}
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as file:
+            json.dump(data, file, separators=(',', ':'))
+        os.replace(tmp_path, path)
+        return len(rows)
+
+    def load(self, path):
+        """Add the nodes from a snapshot file. Returns the number of nodes loaded."""
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            logging.error(f"Unable to read NodeDB snapshot {path}: {e}")
+            return 0
+        if data.get('version') != SNAPSHOT_VERSION:
+            logging.info(f"Ignoring NodeDB snapshot {path} with unknown version {data.get('version')}")
+            return 0
+
+        nodes = {}
+        for num, node_id, short_name, long_name, hw_model, role, last_heard in data.get('nodes', []):
+            user = {'id': node_id, 'shortName': short_name, 'longName': long_name}
+            if hw_model is not None:
+                user['hwModel'] = hw_model
+            if role is not None:
+                user['role'] = role
+            node = {'num': num, 'user': user}
+            if last_heard is not None:
+                node['lastHeard'] = last_heard
+            nodes[node_id] = node
+        with self.lock:
+            for node_id, node in nodes.items():
+                if node_id not in self.by_id:
+                    self._add(node_id, node)
+        return len(nodes)
+
+
+def start_snapshot_writer(index, path, interval):
+    """Save the index to `path` every `interval` seconds if it has changed (0 disables)."""
+    if interval <= 0:
+        return None
+
+    def write_snapshots():
+        while True:
+            time.sleep(interval)
+            if not index.dirty:
+                continue
+            try:
+                count = index.save(path)
+                logging.info(f"Saved NodeDB snapshot with {count} nodes to {path}")
+            except OSError as e:
+                logging.error(f"Unable to save NodeDB snapshot {path}: {e}")
+
+    thread = threading.Thread(target=write_snapshots, name="nodedb-snapshot", daemon=True)
+    thread.start()
+    return thread
+
+
+def get_node_index(interface):
+    """Return the index attached to the interface, building it from interface.nodes on first use."""
+    index = getattr(interface, 'node_index', None)
+    if index is None:
+        with _index_lock:
+            index = getattr(interface, 'node_index', None)
+            if index is None:
+                index = NodeIndex(interface.nodes or {})
+                interface.node_index = index
+    return index
+
+
+def on_node_updated(node, interface):
+    """pubsub callback for meshtastic.node.updated."""
+    get_node_index(interface).update(node)
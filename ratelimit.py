@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+
+_limiter_lock = threading.Lock()
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens are added per second up to `capacity`.
+
+    Callers either try to take tokens straight away with consume(), or ask how
+    long they would have to wait with delay_for().
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated_at = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def available(self):
+        with self.lock:
+            self._refill()
+            return self.tokens
+
+    def consume(self, amount=1):
+        with self.lock:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return True
+            return False
+
+    def force_consume(self, amount):
+        """Take tokens even if it drives the bucket negative (the cost was already paid)."""
+        with self.lock:
+            self._refill()
+            self.tokens -= amount
+
+    def delay_for(self, amount=1):
+        with self.lock:
+            self._refill()
+            missing = min(amount, self.capacity) - self.tokens
+            if missing <= 0:
+                return 0.0
+            if self.rate <= 0:
+                return float('inf')
+            return missing / self.rate
+
+
+class SenderRateLimiter:
+    """
+    Per-sender token buckets in front of command handling.
+
+    Each sender may send `burst` commands at once, refilled at
+    refill_per_minute. The first command over the limit is answered with a
+    short notice; further ones are dropped silently until the sender has
+    tokens again. Buckets for at most max_senders senders are kept, least
+    recently active first out.
+    """
+
+    ALLOW = 'allow'
+    NOTIFY = 'notify'
+    DROP = 'drop'
+
+    def __init__(self, burst=15, refill_per_minute=30, max_senders=1024, clock=time.monotonic):
+        self.burst = burst
+        self.rate = refill_per_minute / 60.0
+        self.max_senders = max(1, max_senders)
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._notified = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            burst=config.getint('ratelimit', 'burst', fallback=15),
+            refill_per_minute=config.getfloat('ratelimit', 'refill_per_minute', fallback=30),
+            max_senders=config.getint('ratelimit', 'max_senders', fallback=1024)
+        )
+
+    @property
+    def enabled(self):
+        return self.burst > 0
+
+    def check(self, sender):
+        """Return ALLOW, NOTIFY (throttled, tell the sender once) or DROP for a command from sender."""
+        if not self.enabled:
+            return self.ALLOW
+        with self._lock:
+            bucket = self._buckets.get(sender)
+            if bucket is None:
+                bucket = self._buckets[sender] = TokenBucket(self.rate, self.burst, clock=self.clock)
+                while len(self._buckets) > self.max_senders:
+                    evicted, _ = self._buckets.popitem(last=False)
+                    self._notified.discard(evicted)
+            else:
+                self._buckets.move_to_end(sender)
+
+            if bucket.consume():
+                self._notified.discard(sender)
+                decision = self.ALLOW
+            elif sender in self._notified:
+                decision = self.DROP
+            else:
+                self._notified.add(sender)
+                decision = self.NOTIFY
+        metrics.increment(f'ratelimit.{decision}')
+        return decision
+
+
+def get_sender_rate_limiter(interface):
+    """Return the rate limiter attached to the interface, creating a default one if needed."""
+    limiter = getattr(interface, 'sender_rate_limiter', None)
+    if limiter is None:
+        with _limiter_lock:
+            limiter = getattr(interface, 'sender_rate_limiter', None)
+            if limiter is None:
+                limiter = SenderRateLimiter()
+                interface.sender_rate_limiter = limiter
+    return limiter
@@ -0,0 +1,194 @@
+"""
+Background retention for bulletins.db and js8call.db.
+
+Each rule limits one table (or one bulletin board) by age and/or row count.
+A daemon thread applies the rules every `interval` seconds, deleting at most
+batch_size rows per transaction so inbound handling never waits long on the
+database. Every expired row is first appended to a gzip-compressed JSON Lines
+archive (one file per table per month), then deleted, and the freed pages are
+returned to the filesystem with PRAGMA incremental_vacuum. That needs the
+database to be in auto_vacuum=INCREMENTAL mode, which takes a full VACUUM to
+switch on; db_admin.py does that on request, never the running BBS.
+"""
+
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import db_pool
+import metrics
+from db_operations import DB_PATH, bulletin_cache
+
+# option name -> (config section/option for the database path, default path, table, date column, date format, UTC?)
+# A date format of None means the column holds epoch milliseconds.
+TABLES = {
+    'bulletins': (None, 'bulletins.db', 'bulletins', 'created_at', None, True),
+    'mail': (None, 'bulletins.db', 'mail', 'created_at', None, True),
+    'tombstones': (None, 'bulletins.db', 'tombstones', 'deleted_at', None, True),
+    'js8call_messages': (('js8call', 'db_file'), 'js8call.db', 'messages', 'timestamp', '%Y-%m-%d %H:%M:%S', True),
+    'js8call_groups': (('js8call', 'db_file'), 'js8call.db', 'groups', 'timestamp', '%Y-%m-%d %H:%M:%S', True),
+    'js8call_urgent': (('js8call', 'db_file'), 'js8call.db', 'urgent', 'timestamp', '%Y-%m-%d %H:%M:%S', True),
+}
+
+
+class RetentionRule:
+    """Keep at most max_rows rows (0 = unlimited) no older than max_age_days (0 = forever)."""
+
+    def __init__(self, name, db_path, table, date_column, date_format, utc, max_age_days=0, max_rows=0, board=None,
+                 exclude_boards=()):
+        self.name = name
+        self.db_path = db_path
+        self.table = table
+        self.date_column = date_column
+        self.date_format = date_format
+        self.utc = utc
+        self.max_age_days = max_age_days
+        self.max_rows = max_rows
+        self.board = board
+        self.exclude_boards = tuple(exclude_boards)
+
+    def _scope(self):
+        if self.board:
+            return "board = ? COLLATE NOCASE", (self.board,)
+        if self.exclude_boards:
+            return f"lower(board) NOT IN ({','.join('?' * len(self.exclude_boards))})", self.exclude_boards
+        return "1", ()
+
+    def expired_ids(self, conn, limit):
+        """The ids of up to `limit` of the oldest rows that break this rule."""
+        scope, params = self._scope()
+        ids = []
+        if self.max_age_days:
+            if self.date_format is None:
+                cutoff = int((time.time() - self.max_age_days * 86400) * 1000)
+            else:
+                now = datetime.now(timezone.utc) if self.utc else datetime.now()
+                cutoff = (now - timedelta(days=self.max_age_days)).strftime(self.date_format)
+            ids = [row[0] for row in conn.execute(
+                f"SELECT id FROM {self.table} WHERE {scope} AND {self.date_column} < ? "
+                f"ORDER BY {self.date_column}, id LIMIT ?", params + (cutoff, limit))]
+        if self.max_rows and len(ids) < limit:
+            # Everything older than the max_rows-th newest row is over the limit. Synced rows are
+            # inserted out of date order, so age is judged by the date column, with id breaking ties.
+            order = f"{self.date_column}, id"
+            oldest_kept = conn.execute(f"SELECT {order} FROM {self.table} WHERE {scope} "
+                                       f"ORDER BY {self.date_column} DESC, id DESC LIMIT 1 OFFSET ?",
+                                       params + (self.max_rows - 1,)).fetchone()
+            if oldest_kept:
+                seen = set(ids)
+                for (row_id,) in conn.execute(f"SELECT id FROM {self.table} WHERE {scope} AND ({order}) < (?, ?) "
+                                              f"ORDER BY {order} LIMIT ?", params + tuple(oldest_kept) + (limit,)):
+                    if len(ids) >= limit:
+                        break
+                    if row_id not in seen:
+                        ids.append(row_id)
+        return ids
+
+
+class RetentionPolicy:
+    def __init__(self, rules, interval=3600.0, batch_size=200, archive_dir='archive', vacuum_pages=1000):
+        self.rules = rules
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.archive_dir = archive_dir
+        self.vacuum_pages = vacuum_pages
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build the policy from [retention]. Rules are options named after a
+        TABLES key, optionally followed by .<board> for bulletins, with the
+        value "max_age_days, max_rows".
+        """
+        rules = []
+        if config.has_section('retention') and config.getboolean('retention', 'enabled', fallback=False):
+            for option, value in config.items('retention'):
+                name, _, board = option.partition('.')
+                if name not in TABLES or (board and name != 'bulletins'):
+                    continue
+                path_option, default_path, table, date_column, date_format, utc = TABLES[name]
+                db_path = config.get(*path_option, fallback=default_path) if path_option else default_path
+                max_age_days, _, max_rows = value.partition(',')
+                rules.append(RetentionRule(option, db_path, table, date_column, date_format, utc,
+                                           int(max_age_days or 0), int(max_rows or 0), board or None))
+            # A board with its own rule is left out of the table-wide bulletins rule.
+            boards = [rule.board.lower() for rule in rules if rule.board]
+            for rule in rules:
+                if rule.name == 'bulletins':
+                    rule.exclude_boards = tuple(boards)
+        return cls(
+            rules,
+            interval=config.getfloat('retention', 'interval', fallback=3600.0),
+            batch_size=config.getint('retention', 'batch_size', fallback=200),
+            archive_dir=config.get('retention', 'archive_dir', fallback='archive'),
+            vacuum_pages=config.getint('retention', 'vacuum_pages', fallback=1000)
+        )
+
+    def _archive(self, table, columns, rows):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"{table}-{datetime.now().strftime('%Y-%m')}.jsonl.gz")
+        archived_at = int(time.time())
+        # Appending to a gzip file adds a new member; readers see one continuous stream.
+        with gzip.open(path, 'at', encoding='utf-8') as archive:
+            for row in rows:
+                archive.write(json.dumps({'table': table, 'archived_at': archived_at,
+                                          'row': dict(zip(columns, row))}) + "\n")
+
+    def apply_rule(self, rule):
+        """Archive and delete everything that breaks `rule`, one batch per transaction. Returns the row count."""
+        removed = 0
+        while True:
+            with db_pool.connection(rule.db_path) as conn:
+                ids = rule.expired_ids(conn, self.batch_size)
+                if not ids:
+                    return removed
+                placeholders = ",".join("?" * len(ids))
+                cursor = conn.execute(f"SELECT * FROM {rule.table} WHERE id IN ({placeholders})", ids)
+                rows = cursor.fetchall()
+                self._archive(rule.table, [column[0] for column in cursor.description], rows)
+                conn.execute(f"DELETE FROM {rule.table} WHERE id IN ({placeholders})", ids)
+                conn.commit()
+            if rule.table == 'bulletins' and rule.db_path == DB_PATH:
+                bulletin_cache.invalidate("boards", *[f"bulletin:{bulletin_id}" for bulletin_id in ids])
+            removed += len(ids)
+            metrics.increment('retention.archived', len(ids))
+            # Give queued inbound work a chance at the database between batches.
+            time.sleep(0.05)
+
+    def run_once(self):
+        start = time.monotonic()
+        touched = set()
+        for rule in self.rules:
+            if not os.path.exists(rule.db_path):
+                continue
+            try:
+                removed = self.apply_rule(rule)
+            except Exception as e:
+                logging.error(f"Retention rule {rule.name} failed: {e}")
+                continue
+            if removed:
+                logging.info(f"Retention archived and removed {removed} rows from {rule.table} ({rule.name})")
+                touched.add(rule.db_path)
+        for db_path in touched:
+            with db_pool.connection(db_path) as conn:
+                if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                    logging.info(f"{db_path} is not in incremental vacuum mode; use db_admin.py to reclaim free space")
+                    continue
+                conn.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})").fetchall()
+        metrics.observe('retention.pass', time.monotonic() - start)
+
+
+def start_retention_job(policy):
+    """Apply the retention policy every policy.interval seconds from a daemon thread."""
+    def run():
+        while True:
+            policy.run_once()
+            time.sleep(policy.interval)
+
+    thread = threading.Thread(target=run, name="retention", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,136 @@
+class CommandRouter:
+    """
+    Resolves an inbound message to its handler with dictionary lookups.
+
+    Handlers are registered up front in four tables:
+
+    - sync handlers, keyed by the text before the first '|' of a sync message
+      ("BULLETIN", "MAIL", ...), called as handler(message, interface) or,
+      for handlers registered with pass_sender, handler(sender_id, message,
+      interface). Handlers registered with dedupe_content=False receive
+      repeated identical messages (e.g. periodic digests);
+    - quick commands, keyed by the first comma-separated token ("sm", "cm",
+      "wx", ...), called as handler(sender_id, message, interface). A command
+      registered with a separator (or a tuple of them) matches when the token
+      is followed by it ("sm,,...", "wx seattle"), and also on its own if bare
+      is set; one without a separator only matches the bare token, so "cm"
+      does not swallow every message that happens to start with "cm";
+    - menus, keyed by a menu context and a single-key choice, called as
+      handler(sender_id, interface) or, for menus registered with pass_state,
+      handler(sender_id, interface, state);
+    - step handlers, keyed by the state's command and optionally its step,
+      called as handler(sender_id, message, step, state, interface).
+
+    Quick commands are checked first, then menu keys for the user's current
+    menu, then the step handler for their state.
+    """
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+        self.sync_handlers = {}
+        self.sync_without_content_dedupe = set()
+        self.quick_commands = {}
+        self.menus = {}
+        self.menu_contexts = {}
+        self.step_handlers = {}
+        self.priority_commands = set()
+
+    def sync(self, prefix, handler, pass_sender=False, dedupe_content=True):
+        self.sync_handlers[prefix] = (handler, pass_sender)
+        if not dedupe_content:
+            self.sync_without_content_dedupe.add(prefix)
+
+    def quick(self, token, handler, separator=None, bare=None):
+        if bare is None:
+            bare = separator is None
+        separators = (separator,) if isinstance(separator, str) else tuple(separator or ())
+        self.quick_commands[token] = (handler, separators, bare)
+
+    def menu(self, context, handlers, pass_state=False):
+        self.menus[context] = (handlers, pass_state)
+
+    def menu_for(self, command, context):
+        """Offer the `context` menu keys to users whose state command is `command`."""
+        self.menu_contexts[command] = context
+
+    def step(self, command, handler, step=None, priority=False):
+        """
+        Register a handler for a state command, optionally for a single step.
+
+        A priority handler receives every message while the user is in that
+        state, before menu keys and the 'x' shortcut are considered.
+        """
+        self.step_handlers.setdefault(command, {})[step] = handler
+        if priority:
+            self.priority_commands.add(command)
+
+    def resolve_sync(self, message):
+        prefix, separator, _ = message.partition('|')
+        return self.sync_handlers.get(prefix) if separator else None
+
+    def is_sync(self, message):
+        return self.resolve_sync(message) is not None
+
+    def dedupe_content(self, message):
+        """Whether a sync message should also be deduplicated by its content."""
+        return message.partition('|')[0] not in self.sync_without_content_dedupe
+
+    def resolve(self, sender_id, message, interface, state):
+        """Return (handler, args) for a user message, or (None, None) if nothing should run."""
+        message_lower = message.lower().strip()
+        message_strip = message.strip()
+
+        # Handle repeated characters for single character commands using a prefix
+        # But exclude quick commands like WX
+        if len(message_lower) == 2 and message_lower[1] == 'x' and message_lower != 'wx':
+            message_lower = message_lower[0]
+
+        token = message_lower.partition(',')[0]
+        if token not in self.quick_commands:
+            token = token.split(' ', 1)[0]
+        entry = self.quick_commands.get(token)
+        if entry is not None:
+            handler, separators, bare = entry
+            if (bare and message_lower == token) or any(message_lower.startswith(separator, len(token))
+                                                        for separator in separators):
+                return handler, (sender_id, message_strip, interface)
+
+        command = state['command'] if state else None
+        if command in self.priority_commands:
+            return self.step_handlers[command][None], (sender_id, message, state['step'], state, interface)
+
+        if message_lower == 'x':
+            # Reset to main menu state
+            return self.fallback, (sender_id, interface)
+
+        if command == 'MENU':
+            context = state['menu'] if state['menu'] in self.menus else 'main'
+        else:
+            context = self.menu_contexts.get(command, 'main')
+        handlers, pass_state = self.menus[context]
+        handler = handlers.get(message_lower)
+        if handler is not None:
+            return handler, (sender_id, interface, state) if pass_state else (sender_id, interface)
+
+        steps = self.step_handlers.get(command) if state else None
+        if steps is None:
+            return self.fallback, (sender_id, interface)
+        step = state['step']
+        handler = steps.get(step) or steps.get(None)
+        if handler is None:
+            return None, None
+        return handler, (sender_id, message, step, state, interface)
+
+    def route(self, sender_id, message, interface, state):
+        handler, args = self.resolve(sender_id, message, interface, state)
+        if handler is not None:
+            handler(*args)
+
+    def route_sync(self, message, interface, sender_id=None):
+        entry = self.resolve_sync(message)
+        if entry is not None:
+            handler, pass_sender = entry
+            if pass_sender:
+                handler(sender_id, message, interface)
+            else:
+                handler(message, interface)
@@ -15,11 +15,24 @@ other BBS servers listed in the config.ini file.
 import logging
 import time
 
+import db_pool
+import metrics
+from anti_entropy import AntiEntropy
 from config_init import initialize_config, get_interface, init_cli_parser, merge_config
-from db_operations import initialize_database
+from db_operations import DB_PATH, bulletin_cache, initialize_database
+from dedupe import PacketDeduplicator
+from dispatch import InboundDispatcher
 from js8call_integration import JS8CallClient
 from message_processing import on_receive
+from node_index import NodeIndex, on_node_updated, start_snapshot_writer
 from pubsub import pub
+from ratelimit import SenderRateLimiter
+from retention import RetentionPolicy, start_retention_job
+from sessions import start_session_reaper
+from sync_outbox import SyncOutbox
+from transmit import TransmitScheduler
+from utils import user_states
+from write_batcher import WriteBatcher
 
 # General logging
 logging.basicConfig(
@@ -59,33 +72,79 @@ def main():
 
     merge_config(system_config, args)
 
+    config = system_config['config']
+    db_pool.configure(config)
+    bulletin_cache.configure(config)
+    snapshot_path = config.get('nodedb', 'snapshot_path', fallback='nodedb.json.gz')
+    node_index = NodeIndex()
+    if snapshot_path:
+        logging.info(f"Loaded {node_index.load(snapshot_path)} nodes from NodeDB snapshot {snapshot_path}")
+
     interface = get_interface(system_config)
     interface.bbs_nodes = system_config['bbs_nodes']
     interface.allowed_nodes = system_config['allowed_nodes']
 
+    node_index.merge(interface.nodes or {})
+    interface.node_index = node_index
+    pub.subscribe(on_node_updated, 'meshtastic.node.updated')
+    logging.info(f"Indexed {len(node_index)} nodes from the radio NodeDB")
+    if snapshot_path:
+        start_snapshot_writer(node_index, snapshot_path, config.getint('nodedb', 'snapshot_interval', fallback=300))
+    interface.transmit_scheduler = TransmitScheduler.from_config(interface, config)
+    interface.transmit_scheduler.start()
+    interface.deduplicator = PacketDeduplicator.from_config(config)
+    interface.sender_rate_limiter = SenderRateLimiter.from_config(config)
+    user_states.configure(config)
+    start_session_reaper(user_states)
+    interface.inbound_dispatcher = InboundDispatcher.from_config(config)
+    interface.inbound_dispatcher.start()
+    interface.write_batcher = WriteBatcher.from_config(DB_PATH, config)
+    interface.write_batcher.start()
+
+    if config.getboolean('anti_entropy', 'enabled', fallback=True) and interface.bbs_nodes:
+        interface.anti_entropy = AntiEntropy.from_config(interface, config)
+        interface.anti_entropy.start()
+
+    metrics.start_reporter(config.getint('metrics', 'log_interval', fallback=300))
+
     logging.info(f"TC²-BBS is running on {system_config['interface_type']} interface...")
 
     initialize_database()
+    interface.sync_outbox = SyncOutbox.from_config(DB_PATH, config)
+    interface.sync_outbox.start(interface)
 
     def receive_packet(packet, interface):
         on_receive(packet, interface)
 
     pub.subscribe(receive_packet, system_config['mqtt_topic'])
+    pub.subscribe(interface.transmit_scheduler.acks.on_routing, 'meshtastic.receive.routing')
 
     # Initialize and start JS8Call Client if configured
     js8call_client = JS8CallClient(interface)
     js8call_client.logger = js8call_logger
 
-    if js8call_client.db_conn:
+    if js8call_client.db_pool:
         js8call_client.connect()
 
+    # Only once every database has been migrated, so retention never races the upgrade.
+    retention = RetentionPolicy.from_config(config)
+    if retention.rules:
+        start_retention_job(retention)
+
     try:
         while True:
             time.sleep(1)
 
     except KeyboardInterrupt:
         logging.info("Shutting down the server...")
+        interface.inbound_dispatcher.stop()
+        interface.write_batcher.stop()
+        interface.sync_outbox.stop()
+        interface.transmit_scheduler.stop()
+        if snapshot_path:
+            node_index.save(snapshot_path)
         interface.close()
+        db_pool.close_all()
         if js8call_client.connected:
             js8call_client.close()
 
@@ -0,0 +1,123 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from db_pool import open_connection
+from migrations import migrate
+
+
+class SessionStore:
+    """
+    Per-user conversation state (the current command, step and a few ids).
+
+    Sessions idle for longer than ttl seconds are forgotten, and at most
+    max_sessions are kept, least recently used first out. States should stay
+    small and JSON-serialisable: store row ids or cursors and re-query the
+    database rather than copying whole result sets into the state.
+
+    When a db_path is configured every change is also written to SQLite, so a
+    conversation in progress (e.g. composing mail) survives a restart.
+    """
+
+    def __init__(self, ttl=1800.0, max_sessions=1000, db_path=None, clock=time.time):
+        self.ttl = ttl
+        self.max_sessions = max(1, max_sessions)
+        self.clock = clock
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if db_path:
+            self.open(db_path)
+
+    def configure(self, config):
+        """Apply the [sessions] section of config.ini and open the database if one is set."""
+        self.ttl = config.getfloat('sessions', 'ttl', fallback=self.ttl)
+        self.max_sessions = max(1, config.getint('sessions', 'max_sessions', fallback=self.max_sessions))
+        db_path = config.get('sessions', 'db_path', fallback='')
+        if db_path:
+            self.open(db_path)
+
+    def open(self, db_path):
+        """Persist sessions to db_path and load the ones that have not expired."""
+        with self._lock:
+            self._conn = open_connection(db_path)
+            migrate(self._conn, 'sessions')
+            self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (self.clock() - self.ttl,))
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT user_id, state, updated_at FROM sessions ORDER BY updated_at DESC LIMIT ?",
+                (self.max_sessions,)).fetchall()
+            for user_id, state, updated_at in reversed(rows):
+                self._sessions[user_id] = (json.loads(state), updated_at)
+        logging.info(f"Restored {len(rows)} user sessions from {db_path}")
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, user_id):
+        now = self.clock()
+        with self._lock:
+            entry = self._sessions.get(user_id)
+            if entry is None:
+                return None
+            state, updated_at = entry
+            if now - updated_at > self.ttl:
+                self._delete(user_id)
+                metrics.increment('sessions.expired')
+                return None
+            return state
+
+    def set(self, user_id, state):
+        now = self.clock()
+        with self._lock:
+            if state is None:
+                self._delete(user_id)
+                return
+            self._sessions[user_id] = (state, now)
+            self._sessions.move_to_end(user_id)
+            if self._conn is not None:
+                try:
+                    self._conn.execute("INSERT OR REPLACE INTO sessions (user_id, state, updated_at) VALUES (?, ?, ?)",
+                                       (user_id, json.dumps(state), now))
+                    self._conn.commit()
+                except (TypeError, ValueError, sqlite3.Error) as e:
+                    logging.error(f"Unable to persist session for {user_id}: {e}")
+            while len(self._sessions) > self.max_sessions:
+                evicted = next(iter(self._sessions))
+                self._delete(evicted)
+                metrics.increment('sessions.evicted')
+            metrics.set_gauge('sessions.active', len(self._sessions))
+
+    def expire(self):
+        """Drop every session that has been idle for longer than the TTL."""
+        cutoff = self.clock() - self.ttl
+        with self._lock:
+            expired = [user_id for user_id, (_, updated_at) in self._sessions.items() if updated_at < cutoff]
+            for user_id in expired:
+                self._delete(user_id)
+            metrics.set_gauge('sessions.active', len(self._sessions))
+        if expired:
+            metrics.increment('sessions.expired', len(expired))
+        return len(expired)
+
+    def _delete(self, user_id):
+        self._sessions.pop(user_id, None)
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+            self._conn.commit()
+
+
+def start_session_reaper(store, interval=60):
+    """Expire idle sessions every `interval` seconds from a daemon thread."""
+    def reap():
+        while True:
+            time.sleep(interval)
+            store.expire()
+
+    thread = threading.Thread(target=reap, name="session-reaper", daemon=True)
+    thread.start()
+    return thread
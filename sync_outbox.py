@@ -0,0 +1,225 @@
+import logging
+import sqlite3
+import threading
+import time
+
+import db_pool
+import metrics
+from db_pool import now_ms
+from node_index import node_id_for_num
+from sync_parts import split_sync_message
+from transmit import get_transmit_scheduler
+
+_outbox_lock = threading.Lock()
+
+
+class SyncOutbox:
+    """
+    Durable queue of sync messages for the peer BBS nodes.
+
+    Every sync message is stored in the sync_outbox table, one row per peer
+    and item (e.g. "mail:<unique_id>"), before anything is sent. A background
+    thread hands due rows to the transmit scheduler on the sync lane and marks
+    a row delivered once the peer acknowledges every packet. A failed or
+    dropped send is retried after base_delay seconds, doubling per attempt up
+    to max_delay, and no later rows for that peer are started while it waits.
+    Up to window rows per peer can be in flight at once, though, so a row
+    that fails can reach the peer after later ones that were already on
+    their way; use window = 1 for strict per-peer ordering. Rows survive
+    restarts and are sent again when the BBS comes back up, and delivered
+    rows are pruned after keep_delivered seconds.
+
+    Queuing an item that is already waiting for a peer replaces the old row,
+    so a peer that has been unreachable receives only the latest version.
+    A message longer than one packet is sent as SYNC_PART pieces that the
+    peer reassembles before handling it.
+    """
+
+    def __init__(self, db_path, base_delay=30.0, max_delay=3600.0, window=4, interval=5.0, keep_delivered=86400.0):
+        self.db_path = db_path
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.window = max(1, window)
+        self.interval = interval
+        self.keep_delivered = keep_delivered
+        self.interface = None
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._peers = set()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._pruned_at = 0.0
+
+    @classmethod
+    def from_config(cls, db_path, config):
+        return cls(
+            db_path,
+            base_delay=config.getfloat('sync_outbox', 'base_delay', fallback=30.0),
+            max_delay=config.getfloat('sync_outbox', 'max_delay', fallback=3600.0),
+            window=config.getint('sync_outbox', 'window', fallback=4),
+            interval=config.getfloat('sync_outbox', 'interval', fallback=5.0),
+            keep_delivered=config.getfloat('sync_outbox', 'keep_delivered_hours', fallback=24.0) * 3600
+        )
+
+    def start(self, interface):
+        with self._cond:
+            if self._running:
+                return
+            self.interface = interface
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="sync-outbox", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Stop the sender; anything not yet acknowledged is sent again after the next start."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def enqueue(self, peers, item_key, message, supersedes=None):
+        """
+        Queue message for every peer in peers. supersedes names an item whose
+        undelivered rows become pointless once this one is queued (a mail that
+        is deleted before a peer received it). A row already handed to the
+        radio cannot be recalled; the peer stores a tombstone for every delete
+        it receives, so a copy that arrives after the delete is ignored.
+        """
+        peers = [node_id_for_num(peer) if isinstance(peer, int) else peer for peer in peers]
+        if not peers:
+            return
+        now = now_ms()
+        try:
+            with db_pool.connection(self.db_path) as conn:
+                for peer in peers:
+                    if supersedes:
+                        conn.execute("DELETE FROM sync_outbox WHERE peer = ? AND item_key = ? AND delivered_at IS NULL",
+                                     (peer, supersedes))
+                    # REPLACE gives the row a new id, so it is sent after everything queued before it.
+                    conn.execute("INSERT OR REPLACE INTO sync_outbox (peer, item_key, message, created_at, next_attempt_at) "
+                                 "VALUES (?, ?, ?, ?, ?)", (peer, item_key, message, now, now))
+                conn.commit()
+        except sqlite3.Error as e:
+            if self.interface is None:
+                logging.error(f"Unable to queue sync message {item_key} before the outbox is started: {e}")
+                return
+            logging.error(f"Unable to queue sync message {item_key}, sending it once without retries: {e}")
+            scheduler = get_transmit_scheduler(self.interface)
+            chunks = split_sync_message(message, scheduler.max_payload_size)
+            if chunks is None:
+                logging.error(f"Sync message {item_key} is too long to send")
+                return
+            for peer in peers:
+                scheduler.enqueue(message, peer, label=f"BBS peer {peer}", number_parts=False, lane='sync',
+                                  chunks=chunks)
+            return
+        metrics.increment('sync_outbox.queued', len(peers))
+        with self._cond:
+            self._cond.notify_all()
+
+    def pending(self, peer=None):
+        """Number of rows not yet delivered, for one peer or all of them."""
+        with db_pool.connection(self.db_path) as conn:
+            if peer is None:
+                return conn.execute("SELECT COUNT(*) FROM sync_outbox WHERE delivered_at IS NULL").fetchone()[0]
+            return conn.execute("SELECT COUNT(*) FROM sync_outbox WHERE peer = ? AND delivered_at IS NULL",
+                                (peer,)).fetchone()[0]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+            try:
+                self.pump()
+            except Exception as e:
+                logging.error(f"Sync outbox error: {e}")
+            with self._cond:
+                if self._running:
+                    self._cond.wait(self.interval)
+
+    def pump(self):
+        """Send every row that is due, at most window unacknowledged rows per peer."""
+        now = now_ms()
+        with db_pool.connection(self.db_path) as conn:
+            queues = conn.execute("SELECT peer, COUNT(*), MIN(created_at) FROM sync_outbox "
+                                  "WHERE delivered_at IS NULL GROUP BY peer").fetchall()
+            for peer, count, oldest in queues:
+                metrics.set_gauge(f'sync_outbox.pending.{peer}', count)
+                metrics.set_gauge(f'sync_outbox.oldest_age.{peer}', round((now - oldest) / 1000.0, 1))
+            for peer in self._peers - {peer for peer, _, _ in queues}:
+                metrics.set_gauge(f'sync_outbox.pending.{peer}', 0)
+                metrics.set_gauge(f'sync_outbox.oldest_age.{peer}', 0)
+            self._peers = {peer for peer, _, _ in queues}
+
+            if time.monotonic() - self._pruned_at > 600:
+                self._pruned_at = time.monotonic()
+                conn.execute("DELETE FROM sync_outbox WHERE delivered_at < ?", (now - int(self.keep_delivered * 1000),))
+                conn.commit()
+
+            due = []
+            for peer, _, _ in queues:
+                rows = conn.execute("SELECT id, message, attempts, next_attempt_at FROM sync_outbox "
+                                    "WHERE peer = ? AND delivered_at IS NULL ORDER BY id LIMIT ?",
+                                    (peer, self.window)).fetchall()
+                for row_id, message, attempts, next_attempt_at in rows:
+                    if next_attempt_at > now:
+                        break
+                    with self._lock:
+                        if row_id in self._in_flight:
+                            continue
+                        self._in_flight[row_id] = attempts
+                    due.append((row_id, peer, message, attempts))
+
+        scheduler = get_transmit_scheduler(self.interface)
+        for row_id, peer, message, attempts in due:
+            chunks = split_sync_message(message, scheduler.max_payload_size)
+            if chunks is None:
+                self._discard(row_id, f"Sync message to BBS peer {peer} is too long to send, discarding it")
+                continue
+            if attempts:
+                metrics.increment('sync_outbox.retries')
+            scheduler.enqueue(message, peer, label=f"BBS peer {peer}", number_parts=False, lane='sync', chunks=chunks,
+                              on_delivery=lambda outbound, row_id=row_id: self._on_delivery(row_id, outbound))
+
+    def _discard(self, row_id, reason):
+        logging.error(reason)
+        with self._lock:
+            self._in_flight.pop(row_id, None)
+        with db_pool.connection(self.db_path) as conn:
+            conn.execute("DELETE FROM sync_outbox WHERE id = ?", (row_id,))
+            conn.commit()
+        metrics.increment('sync_outbox.discarded')
+
+    def _on_delivery(self, row_id, outbound):
+        with self._lock:
+            attempts = self._in_flight.pop(row_id, 0)
+        now = now_ms()
+        with db_pool.connection(self.db_path) as conn:
+            if outbound.status in ('delivered', 'sent'):
+                conn.execute("UPDATE sync_outbox SET delivered_at = ? WHERE id = ?", (now, row_id))
+                metrics.increment('sync_outbox.delivered')
+            else:
+                delay = min(self.max_delay, self.base_delay * (2 ** attempts))
+                conn.execute("UPDATE sync_outbox SET attempts = attempts + 1, next_attempt_at = ? WHERE id = ?",
+                             (now + int(delay * 1000), row_id))
+                logging.info(f"Sync message to {outbound.label} {outbound.status}, retrying in {delay:.0f}s")
+            conn.commit()
+        with self._cond:
+            self._cond.notify_all()
+
+
+def get_sync_outbox(interface, db_path='bulletins.db'):
+    """Return the outbox attached to the interface, starting a default one for db_path if needed."""
+    outbox = getattr(interface, 'sync_outbox', None)
+    if outbox is None:
+        with _outbox_lock:
+            outbox = getattr(interface, 'sync_outbox', None)
+            if outbox is None:
+                outbox = SyncOutbox(db_path)
+                outbox.start(interface)
+                interface.sync_outbox = outbox
+    return outbox
@@ -0,0 +1,90 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from chunking import _split_by_bytes, byte_length
+
+# SYNC_PART|<message id>|<index>/<count>|<piece of the message>
+PART_PREFIX = "SYNC_PART"
+MAX_PARTS = 99
+HEADER_BYTES = byte_length(f"{PART_PREFIX}|00000000|{MAX_PARTS}/{MAX_PARTS}|")
+
+_parts_lock = threading.Lock()
+
+
+def split_sync_message(message, max_payload_size):
+    """
+    The packets to send a sync message as: the message itself if it fits in
+    one, otherwise numbered SYNC_PART pieces. Returns None for a message too
+    long to send even in MAX_PARTS pieces.
+    """
+    if byte_length(message) <= max_payload_size:
+        return [message]
+    pieces = _split_by_bytes(message, max_payload_size - HEADER_BYTES)
+    if len(pieces) > MAX_PARTS:
+        return None
+    message_id = hashlib.sha1(message.encode('utf-8')).hexdigest()[:8]
+    return [f"{PART_PREFIX}|{message_id}|{i}/{len(pieces)}|{piece}" for i, piece in enumerate(pieces, 1)]
+
+
+class SyncPartBuffer:
+    """
+    Collects the SYNC_PART pieces of sync messages that were too long for one
+    packet until every piece of a message has arrived.
+
+    Pieces are kept per (sender, message id), so resent pieces simply replace
+    the copy already held. At most max_messages incomplete messages are kept
+    (the least recently added one is dropped first) and each is forgotten ttl
+    seconds after its last piece arrived; the sending BBS resends the whole
+    message if it was not acknowledged.
+    """
+
+    def __init__(self, max_messages=32, ttl=900.0):
+        self.max_messages = max(1, max_messages)
+        self.ttl = ttl
+        self._messages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, sender_id, message):
+        """Store one SYNC_PART packet, returning the whole message once it is complete."""
+        try:
+            _, message_id, position, piece = message.split("|", 3)
+            index, count = (int(value) for value in position.split("/"))
+        except ValueError:
+            logging.warning(f"Ignoring malformed sync part from {sender_id}: {message[:40]}")
+            return None
+        if not 1 <= index <= count <= MAX_PARTS:
+            logging.warning(f"Ignoring sync part {position} from {sender_id}")
+            return None
+
+        now = time.monotonic()
+        key = (sender_id, message_id)
+        with self._lock:
+            for stale in [k for k, (expires_at, _, _) in self._messages.items() if expires_at <= now]:
+                del self._messages[stale]
+                metrics.increment('sync_parts.expired')
+            _, _, pieces = self._messages.pop(key, (None, count, {}))
+            pieces[index] = piece
+            if len(pieces) < count:
+                self._messages[key] = (now + self.ttl, count, pieces)
+                while len(self._messages) > self.max_messages:
+                    self._messages.popitem(last=False)
+                    metrics.increment('sync_parts.expired')
+                return None
+        metrics.increment('sync_parts.reassembled')
+        return "".join(pieces[i] for i in range(1, count + 1))
+
+
+def get_sync_part_buffer(interface):
+    """Return the part buffer attached to the interface, creating a default one if needed."""
+    buffer = getattr(interface, 'sync_part_buffer', None)
+    if buffer is None:
+        with _parts_lock:
+            buffer = getattr(interface, 'sync_part_buffer', None)
+            if buffer is None:
+                buffer = SyncPartBuffer()
+                interface.sync_part_buffer = buffer
+    return buffer
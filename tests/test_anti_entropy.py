@@ -0,0 +1,115 @@
+import collections
+import importlib
+import os
+import shutil
+import types
+
+import pytest
+
+pytest.importorskip("meshtastic")
+pytest.importorskip("requests")
+
+import anti_entropy
+import db_operations
+from write_batcher import WriteBatcher
+
+
+class Mesh:
+    """Two BBS nodes, each with its own bulletins.db, exchanging sync messages through a queue."""
+
+    def __init__(self, tmp_path, monkeypatch, message_processing):
+        self.message_processing = message_processing
+        self.monkeypatch = monkeypatch
+        self.queue = collections.deque()
+        self.nodes = {}
+        self.current = None
+        for num, peer in ((1, 2), (2, 1)):
+            path = str(tmp_path / f"node{num}.db")
+            interface = types.SimpleNamespace(bbs_nodes=[peer],
+                                              transmit_scheduler=types.SimpleNamespace(max_payload_size=200),
+                                              write_batcher=WriteBatcher(path))
+            interface.sync_outbox = types.SimpleNamespace(
+                enqueue=lambda peers, item_key, message, supersedes=None: [self.send(message, p) for p in peers])
+            interface.write_batcher.start()
+            self.nodes[num] = (path, interface)
+            self.act(num)
+            db_operations.initialize_database()
+        monkeypatch.setattr(anti_entropy, 'send_message', lambda message, peer, interface, **kwargs: self.send(message, peer))
+
+    def act(self, num):
+        self.current = num
+        self.monkeypatch.setattr(db_operations, 'DB_PATH', self.nodes[num][0])
+
+    def send(self, message, peer):
+        assert len(message.encode('utf-8')) <= 200, message
+        self.queue.append((self.current, peer, message))
+
+    def interface(self, num):
+        return self.nodes[num][1]
+
+    def deliver(self):
+        while self.queue:
+            sender, peer, message = self.queue.popleft()
+            self.act(peer)
+            interface = self.interface(peer)
+            self.message_processing.process_message(sender, message, interface, is_sync_message=True)
+            interface.write_batcher.flush()
+            anti_entropy.get_anti_entropy(interface)._items.clear()
+
+    def root(self, num, table):
+        self.act(num)
+        return anti_entropy._digest(anti_entropy.get_anti_entropy(self.interface(num)).items(table))
+
+    def query(self, num, sql, params=()):
+        self.act(num)
+        with db_operations.get_db_connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def close(self):
+        for _, interface in self.nodes.values():
+            interface.write_batcher.stop()
+
+
+@pytest.fixture
+def mesh(tmp_path, monkeypatch):
+    # The command handlers read the menu from ./config.ini when first imported.
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    shutil.copy(os.path.join(root, 'example_config.ini'), tmp_path / 'config.ini')
+    monkeypatch.chdir(tmp_path)
+    mesh = Mesh(tmp_path, monkeypatch, importlib.import_module('message_processing'))
+    yield mesh
+    mesh.close()
+
+
+def add_bulletin(mesh, num, unique_id):
+    mesh.act(num)
+    db_operations.add_bulletin('General', 'AB', 'subject', 'body', [], None, unique_id=unique_id,
+                               created_at=1700000000000)
+
+
+def test_one_sided_delete_converges(mesh):
+    for num in (1, 2):
+        add_bulletin(mesh, num, 'kept')
+        add_bulletin(mesh, num, 'deleted')
+    # Node 2 deletes a bulletin node 1 still has, and an item node 1 never received.
+    [(bulletin_id,)] = mesh.query(2, "SELECT id FROM bulletins WHERE unique_id = 'deleted'")
+    db_operations.delete_bulletin(bulletin_id, [], None)
+    mesh.act(2)
+    db_operations.delete_mail_batched(mesh.interface(2).write_batcher, 'never-arrived')
+    mesh.interface(2).write_batcher.flush()
+    assert mesh.root(1, 'bulletins') != mesh.root(2, 'bulletins')
+
+    mesh.act(1)
+    anti_entropy.get_anti_entropy(mesh.interface(1)).send_roots()
+    mesh.deliver()
+
+    for table in anti_entropy.TABLES:
+        assert mesh.root(1, table) == mesh.root(2, table)
+    for num in (1, 2):
+        assert mesh.query(num, "SELECT unique_id FROM bulletins") == [('kept',)]
+        assert ('never-arrived',) in mesh.query(num, "SELECT unique_id FROM tombstones")
+
+    # A mail that turns up after its delete stays deleted.
+    mesh.act(1)
+    db_operations.add_mail('1', 'AB', '2', 'subject', 'body', [], None, unique_id='never-arrived')
+    assert mesh.query(1, "SELECT COUNT(*) FROM mail") == [(0,)]
@@ -0,0 +1,21 @@
+import pytest
+
+from chunking import byte_length, chunk_message
+
+
+@pytest.mark.parametrize("text", ["", " ", "\n", " \n\t "])
+def test_blank_text_needs_no_packets(text):
+    assert chunk_message(text) == []
+    assert chunk_message(text, number_parts=False) == []
+
+
+def test_short_text_is_one_packet():
+    assert chunk_message("hello\nworld") == ["hello\nworld"]
+
+
+def test_long_text_is_numbered_and_fits():
+    text = "\n".join(f"line {i} " + "é" * 30 for i in range(20))
+    chunks = chunk_message(text, 120)
+    assert len(chunks) > 1
+    assert all(byte_length(chunk) <= 120 for chunk in chunks)
+    assert [chunk.split(" ", 1)[0] for chunk in chunks] == [f"{i}/{len(chunks)}" for i in range(1, len(chunks) + 1)]
@@ -0,0 +1,138 @@
+import sqlite3
+
+import pytest
+
+import migrations
+from migrations import MIGRATIONS, migrate, schema_version
+
+
+def connect(path):
+    conn = sqlite3.connect(str(path))
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def tables(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+
+
+@pytest.fixture
+def legacy_bulletins(tmp_path):
+    """A bulletins.db as created before migrations existed, with sync duplicates."""
+    conn = connect(tmp_path / "bulletins.db")
+    conn.executescript('''
+        CREATE TABLE bulletins (id INTEGER PRIMARY KEY AUTOINCREMENT, board TEXT NOT NULL,
+            sender_short_name TEXT NOT NULL, date TEXT NOT NULL, subject TEXT NOT NULL,
+            content TEXT NOT NULL, unique_id TEXT NOT NULL);
+        CREATE TABLE mail (id INTEGER PRIMARY KEY AUTOINCREMENT, sender TEXT NOT NULL,
+            sender_short_name TEXT NOT NULL, recipient TEXT NOT NULL, date TEXT NOT NULL,
+            subject TEXT NOT NULL, content TEXT NOT NULL, unique_id TEXT NOT NULL);
+        CREATE TABLE channels (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, url TEXT NOT NULL);
+    ''')
+    conn.executemany("INSERT INTO bulletins (board, sender_short_name, date, subject, content, unique_id) "
+                     "VALUES (?, 'AB', '2024-05-01 12:00', ?, 'body', ?)",
+                     [('General', 'first', 'u1'), ('General', 'again', 'u1'), ('Urgent', 'other', 'u2')])
+    conn.executemany("INSERT INTO mail (sender, sender_short_name, recipient, date, subject, content, unique_id) "
+                     "VALUES ('1', 'AB', '2', '2024-05-01 12:00', ?, 'body', ?)",
+                     [('hello', 'm1'), ('hello', 'm1')])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_legacy_bulletins_upgrade_keeps_oldest_duplicate(legacy_bulletins):
+    conn = legacy_bulletins
+    assert migrate(conn, 'bulletins') == len(MIGRATIONS['bulletins'])
+    assert schema_version(conn) == len(MIGRATIONS['bulletins'])
+
+    assert conn.execute("SELECT subject FROM bulletins WHERE unique_id = 'u1'").fetchall() == [('first',)]
+    assert conn.execute("SELECT COUNT(*) FROM mail").fetchone() == (1,)
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute("INSERT INTO bulletins (board, sender_short_name, date, subject, content, unique_id) "
+                     "VALUES ('General', 'AB', '2024-05-02 12:00', 's', 'c', 'u1')")
+
+    assert conn.execute("SELECT total FROM counters WHERE key = 'board:general'").fetchone() == (1,)
+    assert conn.execute("SELECT total, unread FROM counters WHERE key = 'mail:2'").fetchone() == (1, 1)
+    assert conn.execute("SELECT rowid FROM bulletins_fts WHERE bulletins_fts MATCH 'first'").fetchall() == [(1,)]
+    assert conn.execute("SELECT created_at FROM bulletins WHERE unique_id = 'u2'").fetchone()[0] > 0
+    assert {'tombstones', 'sync_outbox'} <= tables(conn)
+
+
+def test_partial_js8call_upgrade(tmp_path):
+    conn = connect(tmp_path / "js8call.db")
+    conn.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, sender TEXT, receiver TEXT, "
+                 "message TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+    conn.execute("INSERT INTO messages (sender, receiver, message) VALUES ('K1ABC', 'N0CALL', 'hi')")
+    conn.commit()
+
+    migrate(conn, 'js8call')
+
+    assert {'messages', 'groups', 'urgent'} <= tables(conn)
+    assert conn.execute("SELECT message FROM messages").fetchall() == [('hi',)]
+    assert schema_version(conn) == len(MIGRATIONS['js8call'])
+
+
+def test_legacy_sessions_upgrade(tmp_path):
+    conn = connect(tmp_path / "sessions.db")
+    conn.execute("CREATE TABLE sessions (user_id INTEGER PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)")
+    conn.execute("INSERT INTO sessions VALUES (1, '{}', 0)")
+    conn.commit()
+
+    migrate(conn, 'sessions')
+
+    assert conn.execute("SELECT COUNT(*) FROM sessions").fetchone() == (1,)
+    assert schema_version(conn) == len(MIGRATIONS['sessions'])
+
+
+@pytest.mark.parametrize('database', sorted(MIGRATIONS))
+def test_rerun_is_a_no_op(tmp_path, database):
+    conn = connect(tmp_path / f"{database}.db")
+    version = migrate(conn, database)
+    schema = conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall()
+
+    assert migrate(conn, database) == version
+    assert conn.execute("SELECT type, name, sql FROM sqlite_master ORDER BY name").fetchall() == schema
+
+
+def test_failed_step_is_rolled_back(tmp_path, monkeypatch):
+    def create_table(conn):
+        conn.execute("CREATE TABLE first (id INTEGER PRIMARY KEY)")
+
+    def half_done(conn):
+        conn.execute("CREATE TABLE second (id INTEGER PRIMARY KEY)")
+        conn.execute("INSERT INTO missing_table VALUES (1)")
+
+    monkeypatch.setitem(migrations.MIGRATIONS, 'test', [create_table, half_done])
+    conn = connect(tmp_path / "test.db")
+
+    with pytest.raises(sqlite3.OperationalError):
+        migrate(conn, 'test')
+
+    assert schema_version(conn) == 1
+    assert tables(conn) == {'first'}
+
+    def fixed(conn):
+        conn.execute("CREATE TABLE second (id INTEGER PRIMARY KEY)")
+
+    monkeypatch.setitem(migrations.MIGRATIONS, 'test', [create_table, fixed])
+    assert migrate(conn, 'test') == 2
+    assert tables(conn) == {'first', 'second'}
+
+
+def test_board_read_markers_become_read_rows(legacy_bulletins):
+    conn = legacy_bulletins
+    steps = MIGRATIONS['bulletins']
+    reads_step = steps.index(migrations._bulletins_add_bulletin_reads)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setitem(MIGRATIONS, 'bulletins', steps[:reads_step])
+        migrate(conn, 'bulletins')
+    conn.execute("INSERT INTO bulletins (board, sender_short_name, date, subject, content, unique_id) "
+                 "VALUES ('General', 'AB', '2024-05-02 12:00', 'newer', 'body', 'u3')")
+    conn.execute("INSERT INTO board_reads (node_id, board, last_read_id) VALUES ('!n1', 'general', 1)")
+    conn.commit()
+
+    migrate(conn, 'bulletins')
+
+    assert conn.execute("SELECT bulletin_id FROM bulletin_reads WHERE node_id = '!n1'").fetchall() == [(1,)]
+    assert conn.execute("SELECT total FROM counters WHERE key = 'read:!n1:general'").fetchone() == (1,)
+    assert 'board_reads' not in tables(conn)
@@ -0,0 +1,37 @@
+import pytest
+
+from router import CommandRouter
+
+
+def fallback(sender_id, interface):
+    pass
+
+
+def weather(sender_id, message, interface):
+    pass
+
+
+def check_mail(sender_id, message, interface):
+    pass
+
+
+@pytest.fixture
+def router():
+    router = CommandRouter(fallback=fallback)
+    router.menu('main', {})
+    router.quick('wx', weather, separator=(',', ' '), bare=True)
+    router.quick('cm', check_mail)
+    return router
+
+
+@pytest.mark.parametrize("message", ["wx", "WX", "wx,48336", "wx 48336", "WX Grand Rapids, MI"])
+def test_weather_with_comma_or_space(router, message):
+    handler, args = router.resolve(1, message, None, None)
+    assert handler is weather
+    assert args == (1, message.strip(), None)
+
+
+@pytest.mark.parametrize("message", ["cm now", "cm,", "wxyz", "w x"])
+def test_quick_commands_need_their_separator(router, message):
+    handler, _ = router.resolve(1, message, None, None)
+    assert handler is fallback
@@ -0,0 +1,33 @@
+from chunking import byte_length
+from sync_parts import MAX_PARTS, SyncPartBuffer, split_sync_message
+
+
+def test_short_message_is_sent_as_is():
+    assert split_sync_message("MAIL|a|b|c", 200) == ["MAIL|a|b|c"]
+
+
+def test_long_message_is_reassembled_in_any_order():
+    message = "BULLETIN|General|AB|subject|" + "é body " * 100 + "|uid"
+    parts = split_sync_message(message, 200)
+    assert len(parts) > 1
+    assert all(byte_length(part) <= 200 for part in parts)
+
+    buffer = SyncPartBuffer()
+    received = [buffer.add('!peer', part) for part in [parts[-1]] + parts[:-1] + [parts[0]]]
+    assert received[:-2] == [None] * (len(parts) - 1)
+    assert received[-2] == message
+    # A resent piece after completion starts a new, incomplete message.
+    assert received[-1] is None
+
+
+def test_pieces_from_different_senders_are_kept_apart():
+    parts = split_sync_message("MAIL|" + "x" * 500, 200)
+    buffer = SyncPartBuffer()
+    for part in parts[:-1]:
+        assert buffer.add('!one', part) is None
+    assert buffer.add('!two', parts[-1]) is None
+    assert buffer.add('!one', parts[-1]) == "MAIL|" + "x" * 500
+
+
+def test_message_too_long_for_max_parts():
+    assert split_sync_message("x" * (200 * (MAX_PARTS + 1)), 200) is None
@@ -0,0 +1,473 @@
+import logging
+import threading
+import time
+from collections import deque
+
+from meshtastic import BROADCAST_NUM
+
+import metrics
+from ack_tracker import AckTracker
+from airtime import AirtimeAccountant
+from chunking import chunk_message
+
+_scheduler_lock = threading.Lock()
+
+# Outbound traffic classes, highest priority first.
+LANES = ('interactive', 'broadcast', 'sync')
+DEFAULT_LANE_WEIGHTS = {'interactive': 8, 'broadcast': 4, 'sync': 1}
+
+
+class OutboundMessage:
+    """
+    A reply waiting in the transmit queue, plus its delivery bookkeeping.
+
+    status moves from 'queued' to 'sent' once every packet is on the air, and
+    then to 'delivered' or 'failed' when all acknowledgements are settled.
+    Messages sent without acks (or to broadcast) finish as 'sent'.
+    """
+
+    def __init__(self, text, destination, channel_index=0, want_ack=True, label=None, droppable=False,
+                 number_parts=True, on_delivery=None, lane='interactive'):
+        self.text = text
+        self.destination = destination
+        self.channel_index = channel_index
+        self.want_ack = want_ack
+        self.droppable = droppable
+        self.number_parts = number_parts
+        self.on_delivery = on_delivery
+        self.lane = lane
+        self.label = label or str(destination)
+        self.enqueued_at = time.monotonic()
+        self.first_sent_at = None
+        self.not_before = 0.0
+        self.chunks = None
+        self.next_chunk = 0
+        self.parts = None
+        self.status = 'queued'
+        self.sent = threading.Event()
+        self.finished = threading.Event()
+        self._unacked = set()
+        self._failed = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def merge(cls, messages):
+        """
+        Combine several queued messages to one destination into a single message.
+
+        The merged message finishes its parts with its own delivery status.
+        """
+        first = messages[0]
+        merged = cls("\n".join(message.text for message in messages), first.destination, first.channel_index,
+                     first.want_ack, first.label, first.droppable, first.number_parts, lane=first.lane)
+        merged.enqueued_at = first.enqueued_at
+        merged.parts = messages
+        return merged
+
+    def can_merge(self, other):
+        return (self.number_parts and other.number_parts
+                and self.chunks is None and other.chunks is None
+                and self.lane == other.lane
+                and self.destination == other.destination
+                and self.channel_index == other.channel_index
+                and self.want_ack == other.want_ack
+                and self.droppable == other.droppable)
+
+    @property
+    def tracks_acks(self):
+        return self.want_ack and self.destination not in (BROADCAST_NUM, '^all')
+
+    @property
+    def failed_parts(self):
+        return sorted(index + 1 for index in self._failed)
+
+    def wait(self, timeout=None):
+        return self.sent.wait(timeout)
+
+    def wait_for_delivery(self, timeout=None):
+        return self.finished.wait(timeout)
+
+    def expect_ack(self, chunk_index):
+        with self._lock:
+            self._unacked.add(chunk_index)
+
+    def mark_chunk(self, chunk_index, delivered):
+        with self._lock:
+            self._unacked.discard(chunk_index)
+            if not delivered:
+                self._failed.add(chunk_index)
+        self._maybe_finish()
+
+    def mark_sent(self):
+        with self._lock:
+            if self.status == 'queued':
+                self.status = 'sent'
+        self.sent.set()
+        for part in self.parts or []:
+            part.first_sent_at = self.first_sent_at
+            part.chunks = self.chunks
+            part.status = self.status
+            part.sent.set()
+        self._maybe_finish()
+
+    def finish(self, status):
+        with self._lock:
+            if self.finished.is_set():
+                return
+            self.status = status
+            self.finished.set()
+        self.sent.set()
+        for part in self.parts or []:
+            part._failed = self._failed
+            part.finish(status)
+        if self.on_delivery:
+            try:
+                self.on_delivery(self)
+            except Exception as e:
+                logging.error(f"Delivery callback error for {self.label}: {e}")
+
+    def _maybe_finish(self):
+        with self._lock:
+            if not self.sent.is_set() or self._unacked:
+                return
+            if self._failed:
+                status = 'failed'
+            elif self.tracks_acks:
+                status = 'delivered'
+            else:
+                status = 'sent'
+        self.finish(status)
+
+
+class Retransmission:
+    """A single chunk of an earlier message queued again after a NAK or timeout."""
+
+    def __init__(self, message, chunk_index, attempt, delay):
+        self.message = message
+        self.chunk_index = chunk_index
+        self.attempt = attempt
+        self.destination = message.destination
+        self.label = message.label
+        self.lane = message.lane
+        self.not_before = time.monotonic() + delay
+
+
+class TransmitScheduler:
+    """
+    Drains outbound text messages to the radio from dedicated worker threads.
+
+    Handlers enqueue replies and return immediately; the workers split each
+    message into byte-sized packets and pace them so the radio is not flooded.
+    Messages to the same destination are never sent by two workers at once, so
+    per-destination ordering is preserved even with several workers. Every
+    packet is charged against the shared airtime budget before it is handed to
+    the radio, and acknowledged packets are tracked so that only lost chunks
+    are sent again.
+
+    Replies are held for coalesce_window seconds after they are queued. Any
+    further replies queued for the same destination in the meantime are merged
+    into one message (newline separated) so that bursts of short lines go out
+    in as few full packets as possible.
+
+    Each message belongs to a lane (interactive, broadcast or sync) with its own
+    queue. With the 'strict' policy a lower lane only transmits when every
+    higher lane is idle; with 'weighted' the lanes share the radio in
+    proportion to lane_weights. Lanes are re-evaluated after every packet, so
+    a long sync message never holds up a menu reply for more than one packet.
+    """
+
+    def __init__(self, interface, workers=1, pacing=2.0, max_payload_size=200, airtime=None, acks=None,
+                 coalesce_window=0.5, policy='strict', lane_weights=None):
+        self.interface = interface
+        self.workers = max(1, workers)
+        self.pacing = pacing
+        self.max_payload_size = max_payload_size
+        self.coalesce_window = coalesce_window
+        self.airtime = airtime or AirtimeAccountant(interface)
+        self.acks = acks or AckTracker(self.retransmit)
+        self.acks.retransmit = self.retransmit
+
+        self.policy = policy
+        self.lane_weights = dict(DEFAULT_LANE_WEIGHTS, **(lane_weights or {}))
+        self._lanes = {lane: deque() for lane in LANES}
+        self._lane_credit = {lane: 0 for lane in LANES}
+        self._busy_destinations = set()
+        self._cond = threading.Condition()
+        self._pacing_lock = threading.Lock()
+        self._next_send_at = 0.0
+        self._threads = []
+        self._running = False
+
+    @classmethod
+    def from_config(cls, interface, config):
+        return cls(
+            interface,
+            workers=config.getint('transmit', 'workers', fallback=1),
+            pacing=config.getfloat('transmit', 'pacing', fallback=2.0),
+            max_payload_size=config.getint('transmit', 'max_payload_size', fallback=200),
+            coalesce_window=config.getfloat('transmit', 'coalesce_window', fallback=0.5),
+            policy=config.get('transmit', 'lane_policy', fallback='strict'),
+            lane_weights=parse_lane_weights(config.get('transmit', 'lane_weights', fallback='')),
+            airtime=AirtimeAccountant.from_config(interface, config),
+            acks=AckTracker(
+                None,
+                timeout=config.getfloat('transmit', 'ack_timeout', fallback=60.0),
+                max_retries=config.getint('transmit', 'max_retries', fallback=2),
+                backoff=config.getfloat('transmit', 'retry_backoff', fallback=5.0)
+            )
+        )
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self.acks.start()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"transmit-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        """Stop the workers, giving queued messages up to `timeout` seconds to drain."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while (any(self._lanes.values()) or self._busy_destinations) and time.monotonic() < deadline:
+                self._cond.wait(0.1)
+            self._running = False
+            self._cond.notify_all()
+        self.acks.stop()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+
+    def enqueue(self, text, destination, channel_index=0, want_ack=True, label=None, droppable=False,
+                number_parts=True, on_delivery=None, lane=None, chunks=None):
+        """
+        Queue text for destination. chunks may carry the packets chunk_message
+        already produced for this text at max_payload_size (e.g. a cached
+        reply); such messages are sent as given and never coalesced.
+        """
+        if lane is None:
+            lane = 'broadcast' if destination in (BROADCAST_NUM, '^all') else 'interactive'
+        if lane not in self._lanes:
+            raise ValueError(f"Unknown transmit lane: {lane}")
+        message = OutboundMessage(text, destination, channel_index, want_ack, label, droppable, number_parts,
+                                  on_delivery, lane)
+        message.chunks = chunks
+        if number_parts and chunks is None:
+            message.not_before = message.enqueued_at + self.coalesce_window
+        self._put(message)
+        metrics.increment('transmit.enqueued')
+        metrics.increment(f'transmit.enqueued.{lane}')
+        return message
+
+    def retransmit(self, message, chunk_index, attempt, delay):
+        self._put(Retransmission(message, chunk_index, attempt, delay))
+
+    def _put(self, item, front=False):
+        with self._cond:
+            if front:
+                self._lanes[item.lane].appendleft(item)
+            else:
+                self._lanes[item.lane].append(item)
+            self._update_depth_gauges()
+            self._cond.notify()
+
+    def _update_depth_gauges(self):
+        for lane, queue in self._lanes.items():
+            metrics.set_gauge(f'transmit.queue_depth.{lane}', len(queue))
+        metrics.set_gauge('transmit.queue_depth', sum(len(queue) for queue in self._lanes.values()))
+
+    def queue_depth(self, lane=None):
+        with self._cond:
+            if lane is not None:
+                return len(self._lanes[lane])
+            return sum(len(queue) for queue in self._lanes.values())
+
+    def _first_ready(self, lane, now):
+        """Return (item, wake_at): the first sendable item of a lane, or when to look again."""
+        wake_at = None
+        for item in self._lanes[lane]:
+            if item.destination in self._busy_destinations:
+                continue
+            if item.not_before > now:
+                wake_at = item.not_before if wake_at is None else min(wake_at, item.not_before)
+                continue
+            return item, None
+        return None, wake_at
+
+    def _pick_lane(self, ready_lanes):
+        if self.policy != 'weighted':
+            return ready_lanes[0]
+        # Smooth weighted round robin over the lanes that have work.
+        total = 0
+        for lane in ready_lanes:
+            self._lane_credit[lane] += self.lane_weights[lane]
+            total += self.lane_weights[lane]
+        chosen = max(ready_lanes, key=lambda lane: self._lane_credit[lane])
+        self._lane_credit[chosen] -= total
+        return chosen
+
+    def _has_other_work(self, lane):
+        with self._cond:
+            now = time.monotonic()
+            return any(self._first_ready(other, now)[0] is not None for other in LANES if other != lane)
+
+    def _next_message(self):
+        with self._cond:
+            while self._running:
+                now = time.monotonic()
+                wake_at = None
+                ready = {}
+                for lane in LANES:
+                    item, lane_wake_at = self._first_ready(lane, now)
+                    if item is not None:
+                        ready[lane] = item
+                    elif lane_wake_at is not None:
+                        wake_at = lane_wake_at if wake_at is None else min(wake_at, lane_wake_at)
+                if ready:
+                    lane = self._pick_lane([lane for lane in LANES if lane in ready])
+                    item = ready[lane]
+                    self._lanes[lane].remove(item)
+                    self._busy_destinations.add(item.destination)
+                    if isinstance(item, OutboundMessage):
+                        item = self._coalesce(item)
+                    self._update_depth_gauges()
+                    return item
+                self._cond.wait(None if wake_at is None else wake_at - now)
+            return None
+
+    def _coalesce(self, first):
+        # Called with self._cond held. Stops at the first queued message to the
+        # same destination that cannot be merged, so ordering is preserved.
+        if not first.number_parts or first.chunks is not None:
+            return first
+        messages = [first]
+        queue = self._lanes[first.lane]
+        for item in list(queue):
+            if item.destination != first.destination or not isinstance(item, OutboundMessage):
+                continue
+            if not first.can_merge(item):
+                break
+            queue.remove(item)
+            messages.append(item)
+        if len(messages) == 1:
+            return first
+        metrics.increment('transmit.coalesced', len(messages) - 1)
+        return OutboundMessage.merge(messages)
+
+    def _release(self, item):
+        with self._cond:
+            self._busy_destinations.discard(item.destination)
+            self._cond.notify_all()
+
+    def _wait_for_slot(self, payload_bytes, droppable):
+        # Pacing is shared by all workers: the radio only has one transmitter.
+        with self._pacing_lock:
+            delay = self._next_send_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if not self.airtime.acquire(payload_bytes, droppable):
+                return False
+            self._next_send_at = time.monotonic() + self.pacing
+            return True
+
+    def _worker(self):
+        while True:
+            item = self._next_message()
+            if item is None:
+                return
+            try:
+                if isinstance(item, Retransmission):
+                    self._transmit_retry(item)
+                else:
+                    self._transmit(item)
+            except Exception as e:
+                logging.error(f"Transmit worker error for {item.label}: {e}")
+                if isinstance(item, OutboundMessage):
+                    item.finish('failed')
+            finally:
+                self._release(item)
+
+    def _transmit(self, message):
+        if message.chunks is None:
+            message.chunks = chunk_message(message.text, self.max_payload_size, message.number_parts)
+        while message.next_chunk < len(message.chunks):
+            index = message.next_chunk
+            chunk = message.chunks[index]
+            if not self._wait_for_slot(len(chunk.encode('utf-8')), message.droppable):
+                logging.info(f"Dropping low-priority message to {message.label}: airtime budget exhausted")
+                message.finish('dropped')
+                return
+            if message.first_sent_at is None:
+                message.first_sent_at = time.monotonic()
+                wait = message.first_sent_at - message.enqueued_at
+                metrics.observe('transmit.latency', wait)
+                metrics.observe(f'transmit.wait.{message.lane}', wait)
+            if not self._send_chunk(message, index, attempt=0):
+                message.mark_chunk(index, delivered=False)
+            message.next_chunk += 1
+            if message.next_chunk < len(message.chunks) and self._has_other_work(message.lane):
+                # Give the lane policy a chance to run before the rest of this message.
+                self._put(message, front=True)
+                return
+        message.mark_sent()
+
+    def _transmit_retry(self, retry):
+        message = retry.message
+        chunk = message.chunks[retry.chunk_index]
+        if not self._wait_for_slot(len(chunk.encode('utf-8')), message.droppable):
+            logging.info(f"Dropping resend to {message.label}: airtime budget exhausted")
+            message.finish('dropped')
+            return
+        if not self._send_chunk(message, retry.chunk_index, retry.attempt):
+            message.mark_chunk(retry.chunk_index, delivered=False)
+
+    def _send_chunk(self, message, index, attempt):
+        chunk = message.chunks[index]
+        try:
+            d = self.interface.sendText(
+                text=chunk,
+                destinationId=message.destination,
+                wantAck=message.want_ack,
+                wantResponse=False,
+                channelIndex=message.channel_index
+            )
+        except Exception as e:
+            metrics.increment('transmit.errors')
+            logging.info(f"REPLY SEND ERROR {e}")
+            return False
+        metrics.increment('transmit.packets')
+        if message.tracks_acks:
+            message.expect_ack(index)
+            self.acks.register(d.id, message, index, attempt)
+        chunk = chunk.replace('\n', '\\n')
+        logging.info(f"Sending message to {message.label} with sendID {d.id}: \"{chunk}\"")
+        return True
+
+
+def get_transmit_scheduler(interface):
+    """Return the scheduler attached to the interface, starting a default one if needed."""
+    scheduler = getattr(interface, 'transmit_scheduler', None)
+    if scheduler is None:
+        with _scheduler_lock:
+            scheduler = getattr(interface, 'transmit_scheduler', None)
+            if scheduler is None:
+                scheduler = TransmitScheduler(interface)
+                scheduler.start()
+                interface.transmit_scheduler = scheduler
+    return scheduler
+
+
+def parse_lane_weights(value):
+    """Parse 'interactive:8,broadcast:4,sync:1' into a dict of lane weights."""
+    weights = {}
+    for item in value.split(','):
+        if ':' not in item:
+            continue
+        lane, weight = item.split(':', 1)
+        lane = lane.strip()
+        if lane in LANES:
+            weights[lane] = max(1, int(weight))
+    return weights
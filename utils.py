@@ -1,87 +1,102 @@
 import logging
-import time
 
-user_states = {}
+from node_index import get_node_index, node_id_for_num
+from sessions import SessionStore
+from sync_outbox import get_sync_outbox
+from transmit import get_transmit_scheduler
+
+user_states = SessionStore()
 
 
 def update_user_state(user_id, state):
-    user_states[user_id] = state
+    user_states.set(user_id, state)
 
 
 def get_user_state(user_id):
-    return user_states.get(user_id, None)
-
-
-def send_message(message, destination, interface):
-    max_payload_size = 200
-    for i in range(0, len(message), max_payload_size):
-        chunk = message[i:i + max_payload_size]
-        try:
-            d = interface.sendText(
-                text=chunk,
-                destinationId=destination,
-                wantAck=True,
-                wantResponse=False
-            )
-            destid = get_node_id_from_num(destination, interface)
-            chunk = chunk.replace('\n', '\\n')
-            logging.info(f"Sending message to user '{get_node_short_name(destid, interface)}' ({destid}) with sendID {d.id}: \"{chunk}\"")
-        except Exception as e:
-            logging.info(f"REPLY SEND ERROR {e.message}")
-
-        
-        time.sleep(2)
+    return user_states.get(user_id)
+
+
+def send_message(message, destination, interface, droppable=False, number_parts=True, on_delivery=None,
+                 lane=None, chunks=None):
+    """
+    Queue a message for transmission and return without waiting for the radio.
+
+    Droppable messages are discarded instead of deferred when the airtime
+    budget is exhausted. Sync messages pass number_parts=False so peers still
+    see the message type at the start of the first packet. on_delivery is
+    called with the OutboundMessage once its delivery status is final.
+    lane picks the priority class; by default broadcasts use the 'broadcast'
+    lane and everything else 'interactive'. chunks passes packets already
+    split by chunk_message, so cached replies are not split again. Blank
+    messages are not sent at all and return None.
+    """
+    if not message.strip():
+        return None
+    destid = get_node_id_from_num(destination, interface)
+    label = f"user '{get_node_short_name(destid, interface)}' ({destid})"
+    return get_transmit_scheduler(interface).enqueue(message, destination, label=label, droppable=droppable,
+                                                  number_parts=number_parts, on_delivery=on_delivery,
+                                                  lane=lane, chunks=chunks)
 
 
 def get_node_info(interface, short_name):
     nodes = [{'num': node_id, 'shortName': node['user']['shortName'], 'longName': node['user']['longName']}
-             for node_id, node in interface.nodes.items()
-             if node['user']['shortName'].lower() == short_name]
+             for node_id, node in get_node_index(interface).find_by_short_name(short_name)]
     return nodes
 
 
 def get_node_id_from_num(node_num, interface):
-    for node_id, node in interface.nodes.items():
-        if node['num'] == node_num:
-            return node_id
-    return None
+    index = get_node_index(interface)
+    node_id = index.id_from_num(node_num)
+    if node_id is None and isinstance(node_num, int):
+        # The node may have been added to the NodeDB before its update event reached the index.
+        node = (interface.nodes or {}).get(node_id_for_num(node_num))
+        if node and node.get('num') == node_num:
+            index.update(node)
+            node_id = index.id_from_num(node_num)
+    return node_id
 
 
 def get_node_short_name(node_id, interface):
-    node_info = interface.nodes.get(node_id)
+    node_info = get_node_index(interface).get(node_id)
+    if node_info is None:
+        node_info = (interface.nodes or {}).get(node_id)
     if node_info:
         return node_info['user']['shortName']
     return None
 
 
-def send_bulletin_to_bbs_nodes(board, sender_short_name, subject, content, unique_id, bbs_nodes, interface):
+def send_bulletin_to_bbs_nodes(board, sender_short_name, subject, content, unique_id, bbs_nodes, interface,
+                               created_at=None):
     message = f"BULLETIN|{board}|{sender_short_name}|{subject}|{content}|{unique_id}"
-    for node_id in bbs_nodes:
-        send_message(message, node_id, interface)
+    if created_at:
+        # Optional trailing field; older peers ignore it and stamp the arrival time.
+        message += f"|{created_at}"
+    get_sync_outbox(interface).enqueue(bbs_nodes, f"bulletin:{unique_id}", message)
 
 
 def send_mail_to_bbs_nodes(sender_id, sender_short_name, recipient_id, subject, content, unique_id, bbs_nodes,
-                           interface):
+                           interface, created_at=None):
     message = f"MAIL|{sender_id}|{sender_short_name}|{recipient_id}|{subject}|{content}|{unique_id}"
+    if created_at:
+        message += f"|{created_at}"
     logging.info(f"SERVER SYNC: Syncing new mail message {subject} sent from {sender_short_name} to other BBS systems.")
-    for node_id in bbs_nodes:
-        send_message(message, node_id, interface)
+    get_sync_outbox(interface).enqueue(bbs_nodes, f"mail:{unique_id}", message)
 
 
-def send_delete_bulletin_to_bbs_nodes(bulletin_id, bbs_nodes, interface):
-    message = f"DELETE_BULLETIN|{bulletin_id}"
-    for node_id in bbs_nodes:
-        send_message(message, node_id, interface)
+def send_delete_bulletin_to_bbs_nodes(unique_id, bbs_nodes, interface):
+    message = f"DELETE_BULLETIN|{unique_id}"
+    get_sync_outbox(interface).enqueue(bbs_nodes, f"delete_bulletin:{unique_id}", message,
+                                       supersedes=f"bulletin:{unique_id}")
 
 
 def send_delete_mail_to_bbs_nodes(unique_id, bbs_nodes, interface):
     message = f"DELETE_MAIL|{unique_id}"
     logging.info(f"SERVER SYNC: Sending delete mail sync message with unique_id: {unique_id}")
-    for node_id in bbs_nodes:
-        send_message(message, node_id, interface)
+    # A peer that has not received the mail yet no longer needs it.
+    get_sync_outbox(interface).enqueue(bbs_nodes, f"delete_mail:{unique_id}", message, supersedes=f"mail:{unique_id}")
 
 
 def send_channel_to_bbs_nodes(name, url, bbs_nodes, interface):
     message = f"CHANNEL|{name}|{url}"
-    for node_id in bbs_nodes:
-        send_message(message, node_id, interface)
+    get_sync_outbox(interface).enqueue(bbs_nodes, f"channel:{name}", message)
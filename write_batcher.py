@@ -0,0 +1,145 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import db_pool
+import metrics
+
+_batcher_lock = threading.Lock()
+
+
+class WriteBatcher:
+    """
+    Group commit for writes that nobody is waiting on, such as rows replayed
+    by a peer BBS.
+
+    Statements submitted to the batcher are executed in submission order by a
+    background thread and committed together once max_rows are queued or
+    max_delay seconds after the first one arrived, so a burst of sync
+    messages costs one fsync per batch instead of one per row. on_commit
+    callbacks run after the commit with the statement's rowcount, which is
+    where notifications belong. If a batch fails, its statements are retried
+    one at a time so a single bad row cannot lose the others.
+
+    Interactive posts do not go through the batcher; they commit directly so
+    the user immediately reads back what they wrote.
+    """
+
+    def __init__(self, db_path, max_rows=100, max_delay=0.05):
+        self.db_path = db_path
+        self.max_rows = max(1, max_rows)
+        self.max_delay = max_delay
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._submitted = 0
+        self._committed = 0
+        self._running = False
+        self._thread = None
+
+    @classmethod
+    def from_config(cls, db_path, config):
+        return cls(
+            db_path,
+            max_rows=config.getint('write_batch', 'max_rows', fallback=100),
+            max_delay=config.getfloat('write_batch', 'max_delay_ms', fallback=50) / 1000.0
+        )
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="write-batcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        """Commit whatever is still queued and stop the writer thread."""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, sql, params=(), on_commit=None):
+        with self._cond:
+            self._submitted += 1
+            self._queue.append((sql, params, on_commit, time.monotonic()))
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Block until everything submitted so far has been committed. Returns False on timeout."""
+        with self._cond:
+            target = self._submitted
+            return self._cond.wait_for(lambda: self._committed >= target, timeout)
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue:
+                if not self._running:
+                    return None
+                self._cond.wait()
+            deadline = self._queue[0][3] + self.max_delay
+            while self._running and len(self._queue) < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(len(self._queue), self.max_rows)
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            rowcounts = self._commit(batch)
+            with self._cond:
+                self._committed += len(batch)
+                self._cond.notify_all()
+            metrics.increment('write_batch.commits')
+            metrics.increment('write_batch.rows', len(batch))
+            metrics.observe('write_batch.latency', time.monotonic() - batch[0][3])
+            for (_, _, on_commit, _), rowcount in zip(batch, rowcounts):
+                if on_commit is None or rowcount is None:
+                    continue
+                try:
+                    on_commit(rowcount)
+                except Exception as e:
+                    logging.error(f"Error after committing batched write: {e}")
+
+    def _commit(self, batch):
+        """Execute and commit the batch, returning each statement's rowcount (None if it failed)."""
+        try:
+            with db_pool.connection(self.db_path) as conn:
+                rowcounts = [conn.execute(sql, params).rowcount for sql, params, _, _ in batch]
+                conn.commit()
+                return rowcounts
+        except sqlite3.Error as e:
+            logging.error(f"Batched write of {len(batch)} statements failed, retrying one at a time: {e}")
+
+        rowcounts = []
+        for sql, params, _, _ in batch:
+            try:
+                with db_pool.connection(self.db_path) as conn:
+                    rowcounts.append(conn.execute(sql, params).rowcount)
+                    conn.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Dropping batched write that failed on its own: {e}")
+                rowcounts.append(None)
+        return rowcounts
+
+
+def get_write_batcher(interface, db_path):
+    """Return the batcher attached to the interface, starting a default one for db_path if needed."""
+    batcher = getattr(interface, 'write_batcher', None)
+    if batcher is None:
+        with _batcher_lock:
+            batcher = getattr(interface, 'write_batcher', None)
+            if batcher is None:
+                batcher = WriteBatcher(db_path)
+                batcher.start()
+                interface.write_batcher = batcher
+    return batcher